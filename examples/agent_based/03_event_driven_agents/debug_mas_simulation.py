@@ -4,10 +4,13 @@ Debug version of the MAS simulation script with detailed logging.
 
 import sys
 import os
+from collections import deque
+import numpy as np
 
 # Add the project root to the Python path
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
 sys.path.insert(0, project_root)
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'shared')))
 
 from core_lib.physical_objects.reservoir import Reservoir
 from core_lib.physical_objects.gate import Gate
@@ -16,6 +19,47 @@ from core_lib.local_agents.control.local_control_agent import LocalControlAgent
 from core_lib.local_agents.perception.digital_twin_agent import DigitalTwinAgent
 from core_lib.core_engine.testing.simulation_harness import SimulationHarness
 from core_lib.central_coordination.collaboration.message_bus import MessageBus
+from state_recorder import StateRecorder
+
+# Upper bound on buffered debug lines; older lines are dropped first.
+# Override with the MAS_DEBUG_LOG_SIZE environment variable for longer runs.
+DEBUG_LOG_SIZE = int(os.environ.get('MAS_DEBUG_LOG_SIZE', 10000))
+
+def flush_debug_log(debug_log):
+    """Format buffered (template, args) debug entries and write them in one call."""
+    if debug_log.maxlen is not None and len(debug_log) == debug_log.maxlen:
+        sys.stderr.write(
+            f"[DEBUG] Log buffer reached its limit of {debug_log.maxlen} lines; earlier lines "
+            "may have been dropped (raise MAS_DEBUG_LOG_SIZE to keep more)\n"
+        )
+    if debug_log:
+        sys.stdout.write("\n".join(template.format(*args) for template, args in debug_log) + "\n")
+        debug_log.clear()
+
+class MessageLog:
+    """(time, message) log backed by preallocated arrays and an integer counter."""
+    def __init__(self, capacity):
+        self.times = np.empty(capacity)
+        self.messages = np.empty(capacity, dtype=object)
+        self.count = 0
+    
+    def append(self, t, message):
+        i = self.count
+        if i == self.times.shape[0]:
+            # Grow geometrically if the run produces more messages than expected
+            self.times = np.concatenate((self.times, np.empty(i)))
+            self.messages = np.concatenate((self.messages, np.empty(i, dtype=object)))
+        self.times[i] = t
+        self.messages[i] = message
+        self.count = i + 1
+    
+    def __len__(self):
+        return self.count
+    
+    def head(self, n):
+        """Return the first n (time, message) pairs."""
+        n = min(n, self.count)
+        return zip(self.times[:n], self.messages[:n])
 
 def run_debug_simulation():
     """
@@ -25,9 +69,14 @@ def run_debug_simulation():
 
     # 1. --- Simulation Harness and Message Bus Setup ---
     simulation_config = {'duration': 50, 'dt': 1.0}  # Shorter simulation for debugging
+    # One slot per simulation step for the recorded state and message logs
+    n_steps = int(simulation_config['duration'] / simulation_config['dt']) + 1
     harness = SimulationHarness(config=simulation_config)
     message_bus = harness.message_bus
 
+    # Per-message debug output is buffered here and written once after the run
+    debug_log = deque(maxlen=DEBUG_LOG_SIZE)
+
     # 2. --- Communication Topics ---
     RESERVOIR_STATE_TOPIC = "state.reservoir.level"
     GATE_ACTION_TOPIC = "action.gate.opening"
@@ -49,16 +98,18 @@ def run_debug_simulation():
     
     # Create a debug wrapper for the gate to log control signals
     class DebugGate(Gate):
-        def __init__(self, *args, **kwargs):
+        def __init__(self, harness, *args, **kwargs):
             super().__init__(*args, **kwargs)
-            self.control_signal_log = []
+            self._harness = harness
+            self.control_signal_log = MessageLog(n_steps)
             
         def handle_control_signal(self, message):
-            print(f"[DEBUG] Gate received control signal: {message}")
-            self.control_signal_log.append((harness.t, message))
+            debug_log.append(("[DEBUG] Gate received control signal: {}", (message,)))
+            self.control_signal_log.append(self._harness.t, message)
             super().handle_control_signal(message)
     
     gate = DebugGate(
+        harness,
         name="gate_1",
         initial_state={'opening': 0.1},
         parameters=gate_params,
@@ -85,22 +136,24 @@ def run_debug_simulation():
 
     # Local Control Agent for the Gate
     class DebugLocalControlAgent(LocalControlAgent):
-        def __init__(self, *args, **kwargs):
+        def __init__(self, harness, *args, **kwargs):
             super().__init__(*args, **kwargs)
-            self.observation_log = []
-            self.control_output_log = []
+            self._harness = harness
+            self.observation_log = MessageLog(n_steps)
+            self.control_output_log = MessageLog(n_steps)
             
         def handle_observation(self, message):
-            print(f"[DEBUG] ControlAgent received observation: {message}")
-            self.observation_log.append((harness.t, message))
+            debug_log.append(("[DEBUG] ControlAgent received observation: {}", (message,)))
+            self.observation_log.append(self._harness.t, message)
             super().handle_observation(message)
             
         def publish_action(self, control_signal):
-            print(f"[DEBUG] ControlAgent publishing action: {control_signal}")
-            self.control_output_log.append((harness.t, control_signal))
+            debug_log.append(("[DEBUG] ControlAgent publishing action: {}", (control_signal,)))
+            self.control_output_log.append(self._harness.t, control_signal)
             super().publish_action(control_signal)
     
     control_agent = DebugLocalControlAgent(
+        harness,
         agent_id="control_agent_gate_1",
         message_bus=message_bus,
         dt=harness.dt,
@@ -120,19 +173,21 @@ def run_debug_simulation():
     control_agent.enable_control_logging(enabled=True, state_topic="control.state.debug", interval=1)
 
     # 5. --- Debug Message Listeners ---
-    def debug_reservoir_state_listener(message):
-        print(f"[DEBUG] Reservoir state published: {message}")
-    
-    def debug_gate_action_listener(message):
-        print(f"[DEBUG] Gate action published: {message}")
+    # Every traced topic goes through the same buffered handler, labelled per topic
+    traced_topics = {
+        RESERVOIR_STATE_TOPIC: "Reservoir state",
+        GATE_ACTION_TOPIC: "Gate action",
+        "control.state.debug": "Control state",
+    }
     
-    def debug_control_state_listener(message):
-        print(f"[DEBUG] Control state published: {message}")
+    def debug_listener(label):
+        def listener(message):
+            debug_log.append(("[DEBUG] {} published: {}", (label, message)))
+        return listener
     
     # Subscribe to all topics for debugging
-    message_bus.subscribe(RESERVOIR_STATE_TOPIC, debug_reservoir_state_listener)
-    message_bus.subscribe(GATE_ACTION_TOPIC, debug_gate_action_listener)
-    message_bus.subscribe("control.state.debug", debug_control_state_listener)
+    for topic, label in traced_topics.items():
+        message_bus.subscribe(topic, debug_listener(label))
 
     # 6. --- Harness Final Setup ---
     print(f"\n=== Simulation Configuration ===")
@@ -149,45 +204,53 @@ def run_debug_simulation():
     harness.add_agent(control_agent)
     harness.add_connection("reservoir_1", "gate_1")
     harness.build()
+    
+    recorder = StateRecorder(
+        harness, [('reservoir_1', 'water_level'), ('gate_1', 'opening')], n_steps, record_time=True
+    )
 
     # 7. --- Run Simulation ---
     print("\n=== Running Debug Simulation ===")
-    harness.run_mas_simulation()
+    try:
+        harness.run_mas_simulation()
+    finally:
+        # Write what was buffered even if the run fails part-way
+        flush_debug_log(debug_log)
     print("\n=== Simulation Complete ===")
 
     # 8. --- Debug Analysis ---
-    print("\n=== Debug Analysis ===")
-    print(f"Final reservoir water level: {harness.history[-1]['reservoir_1']['water_level']:.2f} m")
-    print(f"Final gate opening: {harness.history[-1]['gate_1']['opening']:.3f}")
-    
-    print(f"\nControlAgent received {len(control_agent.observation_log)} observations")
-    print(f"ControlAgent sent {len(control_agent.control_output_log)} control signals")
-    print(f"Gate received {len(gate.control_signal_log)} control signals")
+    # The report is assembled as one list of lines and written in a single call
+    n = recorder.count
+    water_levels = recorder['reservoir_1', 'water_level']
+    gate_openings = recorder['gate_1', 'opening']
+    report = [
+        "\n=== Debug Analysis ===",
+        f"Final reservoir water level: {water_levels[n - 1]:.2f} m",
+        f"Final gate opening: {gate_openings[n - 1]:.3f}",
+        "",
+        f"ControlAgent received {len(control_agent.observation_log)} observations",
+        f"ControlAgent sent {len(control_agent.control_output_log)} control signals",
+        f"Gate received {len(gate.control_signal_log)} control signals",
+    ]
     
     # Show first few observations and control signals
-    if control_agent.observation_log:
-        print("\nFirst 3 observations received by ControlAgent:")
-        for i, (t, obs) in enumerate(control_agent.observation_log[:3]):
-            print(f"  t={t:.1f}s: {obs}")
+    for title, log in (
+        ("First 3 observations received by ControlAgent:", control_agent.observation_log),
+        ("First 3 control signals sent by ControlAgent:", control_agent.control_output_log),
+        ("First 3 control signals received by Gate:", gate.control_signal_log),
+    ):
+        if log:
+            report.append("\n" + title)
+            report.extend(f"  t={t:.1f}s: {message}" for t, message in log.head(3))
     
-    if control_agent.control_output_log:
-        print("\nFirst 3 control signals sent by ControlAgent:")
-        for i, (t, signal) in enumerate(control_agent.control_output_log[:3]):
-            print(f"  t={t:.1f}s: {signal}")
-    
-    if gate.control_signal_log:
-        print("\nFirst 3 control signals received by Gate:")
-        for i, (t, signal) in enumerate(gate.control_signal_log[:3]):
-            print(f"  t={t:.1f}s: {signal}")
-    
-    # Show water level and gate opening over time
-    print("\nWater level and gate opening over time:")
-    for i, step in enumerate(harness.history[:10]):  # Show first 10 steps
-        if 'reservoir_1' in step and 'gate_1' in step:
-            t = step['time']
-            level = step['reservoir_1']['water_level']
-            opening = step['gate_1']['opening']
-            print(f"  t={t:.1f}s: Level={level:.2f}m, Opening={opening:.3f}")
+    # Show water level and gate opening over time (first 10 steps)
+    m = min(n, 10)
+    report.append("\nWater level and gate opening over time:")
+    report.extend(
+        f"  t={t:.1f}s: Level={level:.2f}m, Opening={opening:.3f}"
+        for t, level, opening in zip(recorder.time[:m], water_levels[:m], gate_openings[:m])
+    )
+    sys.stdout.write("\n".join(report) + "\n")
 
 if __name__ == "__main__":
     run_debug_simulation()
\ No newline at end of file
@@ -5,13 +5,21 @@
 
 import sys
 import os
-import matplotlib.pyplot as plt
+import argparse
+from collections import deque
 import numpy as np
 from datetime import datetime
 
 # Add the project root to the Python path
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
 sys.path.insert(0, project_root)
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'shared')))
+
+# 无图形界面的环境下直接使用非交互的Agg后端，跳过GUI后端初始化
+from plot_backend import use_headless_backend, show_enabled
+use_headless_backend()
+import matplotlib.pyplot as plt
+from matplotlib.font_manager import FontProperties
 
 from core_lib.physical_objects.reservoir import Reservoir
 from core_lib.physical_objects.gate import Gate
@@ -20,16 +28,63 @@ from core_lib.local_agents.control.local_control_agent import LocalControlAgent
 from core_lib.local_agents.perception.digital_twin_agent import DigitalTwinAgent
 from core_lib.core_engine.testing.simulation_harness import SimulationHarness
 from core_lib.central_coordination.collaboration.message_bus import MessageBus
+from state_recorder import StateRecorder
+
+# 中文字体设置只做一次；标题使用同一个FontProperties对象，避免每次调用重新解析字体
+plt.rcParams['font.sans-serif'] = ['SimHei', 'DejaVu Sans']
+plt.rcParams['axes.unicode_minus'] = False
+SIMHEI_FONT = FontProperties(family='SimHei')
+
+# 缓冲的调试输出行数上限，超出时丢弃最早的记录；长时间运行可通过环境变量 MAS_DEBUG_LOG_SIZE 调大
+DEBUG_LOG_SIZE = int(os.environ.get('MAS_DEBUG_LOG_SIZE', 10000))
+
+def flush_debug_log(debug_log):
+    """将缓冲的 (模板, 参数) 调试记录格式化后一次性写出；缓冲已满时提示较早的记录可能已被丢弃"""
+    if debug_log.maxlen is not None and len(debug_log) == debug_log.maxlen:
+        sys.stderr.write(
+            f"[DEBUG] 调试缓冲已达上限 {debug_log.maxlen} 行，较早的记录可能已被丢弃"
+            "（可通过 MAS_DEBUG_LOG_SIZE 调大）\n"
+        )
+    if debug_log:
+        sys.stdout.write("\n".join(template.format(*args) for template, args in debug_log) + "\n")
+        debug_log.clear()
+
+# PID控制器参数 (仿真与事后回放共用)
+PID_CONFIG = {'Kp': 10.0, 'Ki': 1.0, 'Kd': 0.0, 'setpoint': 12.0, 'min_output': 0.0, 'max_output': 1.0}
+
+# 数值信号记录的结构化数组类型：时间和数值
+SIGNAL_DTYPE = np.dtype([('t', np.float64), ('v', np.float64)])
+
+class SignalBuffer:
+    """按索引写入的 (时间, 数值) 预分配缓冲区，容量不足时按倍数扩容"""
+    def __init__(self, capacity):
+        self._data = np.empty(capacity, dtype=SIGNAL_DTYPE)
+        self._count = 0
+    
+    def append(self, time, value):
+        i = self._count
+        if i == self._data.shape[0]:
+            grown = np.empty(2 * i, dtype=SIGNAL_DTYPE)
+            grown[:i] = self._data
+            self._data = grown
+        self._data[i] = (time, value)
+        self._count = i + 1
+    
+    @property
+    def records(self):
+        """已记录的数据 (结构化数组视图，字段 't' 和 'v')"""
+        return self._data[:self._count]
 
 class DebugMessageTracker:
     """用于跟踪消息传递的调试类"""
-    def __init__(self):
+    def __init__(self, capacity=1024):
         self.messages = {
             'reservoir_state': [],
-            'gate_actions': [],
-            'control_signals': [],
-            'pid_outputs': []
+            'gate_actions': []
         }
+        # 控制信号和PID输出是纯数值，直接写入预分配的结构化数组
+        self._control_signals = SignalBuffer(capacity)
+        self._pid_outputs = SignalBuffer(capacity)
         self.time_stamps = []
     
     def track_reservoir_state(self, time, message):
@@ -39,20 +94,38 @@ class DebugMessageTracker:
         self.messages['gate_actions'].append((time, message))
     
     def track_control_signal(self, time, message):
-        self.messages['control_signals'].append((time, message))
+        # 写入时即归一化为浮点数，绘图时无需再逐条判断消息类型
+        value = message if isinstance(message, (int, float)) else message.get('control_signal', 0)
+        self._control_signals.append(time, value)
     
     def track_pid_output(self, time, output):
-        self.messages['pid_outputs'].append((time, output))
-
-def run_simulation_with_tracking():
-    """运行带有消息跟踪的仿真"""
-    print("=== 运行带跟踪的仿真 ===")
+        self._pid_outputs.append(time, output)
     
-    # 创建消息跟踪器
-    tracker = DebugMessageTracker()
+    @property
+    def control_signals(self):
+        """已记录的控制信号 (结构化数组视图，字段 't' 和 'v')"""
+        return self._control_signals.records
+    
+    @property
+    def pid_outputs(self):
+        """已记录的PID输出 (结构化数组视图，字段 't' 和 'v')"""
+        return self._pid_outputs.records
+
+def run_simulation_with_tracking(track_messages=True):
+    """运行仿真；track_messages为False时不挂载任何消息跟踪，仅用于绘图"""
+    print("=== 运行带跟踪的仿真 ===" if track_messages else "=== 运行仿真 (不跟踪消息) ===")
     
     # 1. 仿真设置
     simulation_config = {'duration': 100, 'dt': 1.0}  # 较短的仿真时间用于调试
+    
+    # 创建消息跟踪器，按仿真步数预分配PID输出记录
+    tracker = None
+    if track_messages:
+        tracker = DebugMessageTracker(int(simulation_config['duration'] / simulation_config['dt']) + 1)
+    
+    # 逐条消息的调试输出先写入缓冲区，仿真结束后统一输出
+    debug_log = deque(maxlen=DEBUG_LOG_SIZE)
+    
     harness = SimulationHarness(config=simulation_config)
     message_bus = harness.message_bus
 
@@ -74,18 +147,7 @@ def run_simulation_with_tracking():
         'max_opening': 1.0
     }
     
-    # 创建带有跟踪功能的闸门
-    class TrackedGate(Gate):
-        def __init__(self, *args, **kwargs):
-            super().__init__(*args, **kwargs)
-            self.tracker = tracker
-            
-        def handle_control_signal(self, message):
-            print(f"[DEBUG] 闸门接收到控制信号: {message}")
-            tracker.track_gate_action(harness.t, message)
-            super().handle_control_signal(message)
-    
-    gate = TrackedGate(
+    gate = Gate(
         name="gate_1",
         initial_state={'opening': 0.1},
         parameters=gate_params,
@@ -102,42 +164,24 @@ def run_simulation_with_tracking():
         state_topic=RESERVOIR_STATE_TOPIC
     )
 
-    # PID控制器
+    # PID控制器 (仅在跟踪消息时包装输出记录)
     class TrackedPIDController(PIDController):
         def __init__(self, *args, **kwargs):
             super().__init__(*args, **kwargs)
             self.tracker = tracker
+            self._harness = harness
             
         def update(self, measurement, dt):
             output = super().update(measurement, dt)
-            print(f"[DEBUG] PID输出: {output:.4f} (测量值: {measurement:.2f}, 设定值: {self.setpoint:.2f})")
-            tracker.track_pid_output(harness.t, output)
+            debug_log.append(("[DEBUG] PID输出: {:.4f} (测量值: {:.2f}, 设定值: {:.2f})", (output, measurement, self.setpoint)))
+            self.tracker.track_pid_output(self._harness.t, output)
             return output
     
-    pid_controller = TrackedPIDController(
-        Kp=10.0, Ki=1.0, Kd=0.0,
-        setpoint=12.0,
-        min_output=0.0,
-        max_output=gate_params['max_opening']
-    )
+    controller_class = TrackedPIDController if track_messages else PIDController
+    pid_controller = controller_class(**PID_CONFIG)
 
     # 本地控制智能体
-    class TrackedLocalControlAgent(LocalControlAgent):
-        def __init__(self, *args, **kwargs):
-            super().__init__(*args, **kwargs)
-            self.tracker = tracker
-            
-        def handle_observation(self, message):
-            print(f"[DEBUG] 控制智能体接收到观测值: {message}")
-            tracker.track_reservoir_state(harness.t, message)
-            super().handle_observation(message)
-            
-        def publish_action(self, control_signal):
-            print(f"[DEBUG] 控制智能体发布动作: {control_signal}")
-            tracker.track_control_signal(harness.t, control_signal)
-            super().publish_action(control_signal)
-    
-    control_agent = TrackedLocalControlAgent(
+    control_agent = LocalControlAgent(
         agent_id="control_agent_gate_1",
         message_bus=message_bus,
         dt=harness.dt,
@@ -153,6 +197,31 @@ def run_simulation_with_tracking():
         action_topic=GATE_ACTION_TOPIC
     )
 
+    # 消息跟踪：每个主题只注册一个监听器，直接订阅消息总线，
+    # 不再通过子类覆写 + super() 链转发每条消息
+    def on_reservoir_state(message):
+        debug_log.append(("[DEBUG] 水库状态消息: {}", (message,)))
+        tracker.track_reservoir_state(harness.t, message)
+    
+    def on_gate_action(message):
+        debug_log.append(("[DEBUG] 闸门动作消息: {}", (message,)))
+        tracker.track_gate_action(harness.t, message)
+    
+    if track_messages:
+        message_bus.subscribe(RESERVOIR_STATE_TOPIC, on_reservoir_state)
+        message_bus.subscribe(GATE_ACTION_TOPIC, on_gate_action)
+        
+        # 控制信号取自智能体自身的动作输出 (publish_action)，而不是闸门收到的消息；
+        # 在实例上包装一次，不引入子类
+        publish_action = control_agent.publish_action
+        
+        def tracked_publish_action(control_signal):
+            debug_log.append(("[DEBUG] 控制智能体发布动作: {}", (control_signal,)))
+            tracker.track_control_signal(harness.t, control_signal)
+            publish_action(control_signal)
+        
+        control_agent.publish_action = tracked_publish_action
+
     # 5. 仿真框架设置
     harness.add_component("reservoir_1", reservoir)
     harness.add_component("gate_1", gate)
@@ -160,78 +229,140 @@ def run_simulation_with_tracking():
     harness.add_agent(control_agent)
     harness.add_connection("reservoir_1", "gate_1")
     harness.build()
+    
+    # 按仿真步数预分配状态记录数组
+    n_steps = int(simulation_config['duration'] / simulation_config['dt']) + 1
+    recorder = StateRecorder(
+        harness, [('reservoir_1', 'water_level'), ('gate_1', 'opening')], n_steps, record_time=True
+    )
 
     # 6. 运行仿真
     print("\n=== 开始仿真 ===")
-    harness.run_mas_simulation()
+    try:
+        harness.run_mas_simulation()
+    finally:
+        # 仿真中途出错时也写出已缓冲的调试记录
+        flush_debug_log(debug_log)
     print("\n=== 仿真完成 ===")
 
-    return harness, tracker
+    return harness, tracker, recorder
 
-def plot_control_process(harness, tracker):
+# 控制过程图的缓存 (fig, axes, lines)，重复绘图时复用同一Figure
+_CONTROL_PROCESS_FIGURE = None
+
+def _get_control_process_figure():
+    """创建控制过程图的Figure、Axes和曲线对象，之后的调用直接复用"""
+    global _CONTROL_PROCESS_FIGURE
+    if _CONTROL_PROCESS_FIGURE is not None:
+        return _CONTROL_PROCESS_FIGURE
+    
+    fig, axes = plt.subplots(3, 1, figsize=(12, 10))
+    fig.suptitle('水位控制系统过程分析', fontsize=16, fontproperties=SIMHEI_FONT)
+    lines = {}
+    
+    ax1, ax2, ax3 = axes
+    
+    # 1. 水位变化图
+    lines['water_level'], = ax1.plot([], [], 'b-', linewidth=2, label='实际水位')
+    ax1.axhline(y=12.0, color='r', linestyle='--', linewidth=2, label='目标水位')
+    
+    # 2. 闸门开度变化图
+    lines['gate_opening'], = ax2.plot([], [], 'g-', linewidth=2, label='闸门开度')
+    
+    # 3. 控制信号和PID输出图
+    lines['pid_output'], = ax3.plot([], [], 'r-', linewidth=2, label='PID输出')
+    lines['control_signal'], = ax3.plot([], [], 'orange', marker='o', linestyle='', label='控制信号')
+    ax3.set_xlabel('时间 (s)', fontsize=12)
+    
+    # 三个子图共同的标题/纵轴标签/图例/网格设置
+    for ax, title, ylabel in (
+        (ax1, '水位变化过程', '水位 (m)'),
+        (ax2, '闸门开度变化过程', '闸门开度'),
+        (ax3, '控制信号分析', '控制信号'),
+    ):
+        ax.set_title(title, fontsize=14, fontproperties=SIMHEI_FONT)
+        ax.set_ylabel(ylabel, fontsize=12)
+        ax.legend()
+        ax.grid(True, alpha=0.3)
+    
+    fig.tight_layout()
+    
+    _CONTROL_PROCESS_FIGURE = (fig, axes, lines)
+    return _CONTROL_PROCESS_FIGURE
+
+def replay_pid_outputs(times, water_levels, dt):
+    """
+    用相同参数的PID控制器对记录的水位做事后回放，得到PID输出；
+    结果是重建值，与仿真中实际发出的控制信号不一定一致
+    """
+    pid = PIDController(**PID_CONFIG)
+    outputs = np.empty(len(water_levels), dtype=SIGNAL_DTYPE)
+    outputs['t'] = times
+    for i, level in enumerate(water_levels):
+        outputs['v'][i] = pid.update(level, dt)
+    return outputs
+
+def plot_control_process(harness, tracker=None, recorder=None):
     """绘制控制过程图"""
     print("\n=== 绘制控制过程图 ===")
     
-    # 提取仿真数据
-    times = [step['time'] for step in harness.history]
-    water_levels = [step['reservoir_1']['water_level'] for step in harness.history if 'reservoir_1' in step]
-    gate_openings = [step['gate_1']['opening'] for step in harness.history if 'gate_1' in step]
+    # 提取仿真数据：优先使用记录器的预分配数组，否则从history中提取
+    if recorder is not None:
+        times = recorder.time
+        water_levels = recorder['reservoir_1', 'water_level']
+        gate_openings = recorder['gate_1', 'opening']
+    else:
+        # 单次遍历history，同时填充三个预分配数组
+        n = len(harness.history)
+        times = np.empty(n)
+        water_levels = np.empty(n)
+        gate_openings = np.empty(n)
+        for i, step in enumerate(harness.history):
+            times[i] = step['time']
+            water_levels[i] = step['reservoir_1']['water_level']
+            gate_openings[i] = step['gate_1']['opening']
     
-    # 提取跟踪数据
-    reservoir_states = tracker.messages['reservoir_state']
-    gate_actions = tracker.messages['gate_actions']
-    control_signals = tracker.messages['control_signals']
-    pid_outputs = tracker.messages['pid_outputs']
+    # 提取跟踪数据；未跟踪消息时由水位记录回放得到PID输出，并在图例中注明为回放重建
+    if tracker is not None:
+        control_signals = tracker.control_signals
+        pid_outputs = tracker.pid_outputs
+        pid_label = 'PID输出'
+    else:
+        control_signals = np.empty(0, dtype=SIGNAL_DTYPE)
+        pid_outputs = replay_pid_outputs(times, water_levels, harness.dt)
+        pid_label = 'PID输出 (回放重建，非实测)'
     
-    # 创建图表
-    fig, axes = plt.subplots(3, 1, figsize=(12, 10))
-    fig.suptitle('水位控制系统过程分析', fontsize=16, fontproperties='SimHei')
+    # 获取(或复用)图表骨架，只更新曲线数据
+    fig, axes, lines = _get_control_process_figure()
     
     # 1. 水位变化图
-    ax1 = axes[0]
-    ax1.plot(times, water_levels, 'b-', linewidth=2, label='实际水位')
-    ax1.axhline(y=12.0, color='r', linestyle='--', linewidth=2, label='目标水位')
-    ax1.set_ylabel('水位 (m)', fontsize=12)
-    ax1.set_title('水位变化过程', fontsize=14, fontproperties='SimHei')
-    ax1.legend()
-    ax1.grid(True, alpha=0.3)
+    lines['water_level'].set_data(times, water_levels)
     
     # 2. 闸门开度变化图
-    ax2 = axes[1]
-    ax2.plot(times, gate_openings, 'g-', linewidth=2, label='闸门开度')
-    ax2.set_ylabel('闸门开度', fontsize=12)
-    ax2.set_title('闸门开度变化过程', fontsize=14, fontproperties='SimHei')
-    ax2.legend()
-    ax2.grid(True, alpha=0.3)
+    lines['gate_opening'].set_data(times, gate_openings)
     
     # 3. 控制信号和PID输出图
-    ax3 = axes[2]
-    if pid_outputs:
-        pid_times = [t for t, _ in pid_outputs]
-        pid_values = [v for _, v in pid_outputs]
-        ax3.plot(pid_times, pid_values, 'r-', linewidth=2, label='PID输出')
+    lines['pid_output'].set_data(pid_outputs['t'], pid_outputs['v'])
+    lines['pid_output'].set_label(pid_label)
     
-    if control_signals:
-        signal_times = [t for t, _ in control_signals]
-        signal_values = [v if isinstance(v, (int, float)) else v.get('control_signal', 0) for _, v in control_signals]
-        ax3.plot(signal_times, signal_values, 'orange', marker='o', linestyle='', label='控制信号')
+    lines['control_signal'].set_data(control_signals['t'], control_signals['v'])
+    axes[2].legend()
     
-    ax3.set_xlabel('时间 (s)', fontsize=12)
-    ax3.set_ylabel('控制信号', fontsize=12)
-    ax3.set_title('控制信号分析', fontsize=14, fontproperties='SimHei')
-    ax3.legend()
-    ax3.grid(True, alpha=0.3)
-    
-    plt.tight_layout()
+    for ax in axes:
+        ax.relim()
+        ax.autoscale_view()
     
     # 保存图表
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     filename = f'control_process_analysis_{timestamp}.png'
-    plt.savefig(filename, dpi=300, bbox_inches='tight')
+    # 预先计算紧凑边界框，避免savefig内部为bbox_inches='tight'额外渲染一次
+    tight_bbox = fig.get_tightbbox(fig.canvas.get_renderer()).padded(0.1)
+    fig.savefig(filename, dpi=120, bbox_inches=tight_bbox)
     print(f"控制过程图已保存为: {filename}")
     
-    # 显示图表
-    plt.show()
+    # 显示图表 (非交互的Agg后端下跳过)
+    if show_enabled():
+        plt.show()
     
     return filename
 
@@ -241,8 +372,8 @@ def print_debug_analysis(tracker):
     
     print(f"水库状态消息数量: {len(tracker.messages['reservoir_state'])}")
     print(f"闸门动作消息数量: {len(tracker.messages['gate_actions'])}")
-    print(f"控制信号消息数量: {len(tracker.messages['control_signals'])}")
-    print(f"PID输出记录数量: {len(tracker.messages['pid_outputs'])}")
+    print(f"控制信号消息数量: {len(tracker.control_signals)}")
+    print(f"PID输出记录数量: {len(tracker.pid_outputs)}")
     
     # 显示前几条消息
     if tracker.messages['reservoir_state']:
@@ -250,32 +381,38 @@ def print_debug_analysis(tracker):
         for i, (t, msg) in enumerate(tracker.messages['reservoir_state'][:3]):
             print(f"  t={t:.1f}s: {msg}")
     
-    if tracker.messages['control_signals']:
+    if len(tracker.control_signals):
         print("\n前3条控制信号消息:")
-        for i, (t, msg) in enumerate(tracker.messages['control_signals'][:3]):
-            print(f"  t={t:.1f}s: {msg}")
+        for t, value in tracker.control_signals[:3]:
+            print(f"  t={t:.1f}s: {value:.4f}")
     
     if tracker.messages['gate_actions']:
         print("\n前3条闸门动作消息:")
         for i, (t, msg) in enumerate(tracker.messages['gate_actions'][:3]):
             print(f"  t={t:.1f}s: {msg}")
     
-    if tracker.messages['pid_outputs']:
+    if len(tracker.pid_outputs):
         print("\n前3个PID输出:")
-        for i, (t, output) in enumerate(tracker.messages['pid_outputs'][:3]):
+        for t, output in tracker.pid_outputs[:3]:
             print(f"  t={t:.1f}s: {output:.4f}")
 
 def main():
     """主函数"""
+    parser = argparse.ArgumentParser(description='水位控制系统控制过程可视化')
+    parser.add_argument('--plot-only', action='store_true',
+                        help='只绘图，不挂载消息跟踪 (PID输出由水位记录回放重建，图例中注明)')
+    args = parser.parse_args()
+    
     try:
         # 运行仿真
-        harness, tracker = run_simulation_with_tracking()
+        harness, tracker, recorder = run_simulation_with_tracking(track_messages=not args.plot_only)
         
         # 打印调试分析
-        print_debug_analysis(tracker)
+        if tracker is not None:
+            print_debug_analysis(tracker)
         
         # 绘制控制过程图
-        plot_filename = plot_control_process(harness, tracker)
+        plot_filename = plot_control_process(harness, tracker, recorder)
         
         print(f"\n=== 分析完成 ===")
         print(f"控制过程图已保存为: {plot_filename}")
@@ -9,13 +9,14 @@ communicate only via a MessageBus.
 
 import sys
 import os
+import argparse
 import yaml
-import matplotlib.pyplot as plt
 import numpy as np
 
 # Add the project root to the Python path
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
 sys.path.insert(0, project_root)
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'shared')))
 
 from core_lib.physical_objects.reservoir import Reservoir
 from core_lib.physical_objects.gate import Gate
@@ -27,47 +28,77 @@ from core_lib.local_agents.perception.digital_twin_agent import DigitalTwinAgent
 from core_lib.core_engine.testing.simulation_harness import SimulationHarness
 from core_lib.central_coordination.collaboration.message_bus import MessageBus
 
+# Prefer the libyaml-backed loader when PyYAML was built with it
+YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+# Config type name -> class
+COMPONENT_TYPES = {
+    'Reservoir': Reservoir,
+    'Gate': Gate,
+}
+CONTROLLER_TYPES = {
+    'PIDController': PIDController,
+    'AdaptivePIDController': AdaptivePIDController,
+    'SmartPIDController': SmartPIDController,
+}
+CONTROLLER_ARGS = ('Kp', 'Ki', 'Kd', 'setpoint', 'min_output', 'max_output')
+
+# Shared read-only default for optional config sections; never pass it to
+# constructors that might keep or mutate it
+_EMPTY = {}
+
+def _intern_topics(config):
+    """
+    Intern all topic names so every reference to a topic shares one string
+    object and MessageBus lookups hit the identity fast path.
+    """
+    topics = (config.get('communication') or _EMPTY).get('topics')
+    if topics:
+        for key, topic in topics.items():
+            topics[key] = sys.intern(topic)
+    for comp_config in (config.get('components') or _EMPTY).values():
+        mb_config = comp_config.get('message_bus')
+        if mb_config and 'action_topic' in mb_config:
+            mb_config['action_topic'] = sys.intern(mb_config['action_topic'])
+
 def load_config(config_path):
     """Load configuration from YAML file."""
-    with open(config_path, 'r', encoding='utf-8') as file:
-        return yaml.safe_load(file)
+    # Binary mode: the loader detects the encoding and decodes in C
+    with open(config_path, 'rb') as file:
+        config = yaml.load(file, Loader=YAML_LOADER)
+    if config:
+        _intern_topics(config)
+    return config
 
 def create_components(config, message_bus):
     """Create components based on configuration."""
     components = {}
     topics = config['communication']['topics']
+    gate_action_topic = topics['gate_action']
     
     for name, comp_config in config['components'].items():
         comp_type = comp_config['type']
         initial_state = comp_config.get('initial_state', {})
         parameters = comp_config.get('parameters', {})
         
-        if comp_type == 'Reservoir':
-            components[name] = Reservoir(
-                name=name,
-                initial_state=initial_state,
-                parameters=parameters
-            )
-        elif comp_type == 'Gate':
+        component_cls = COMPONENT_TYPES.get(comp_type)
+        if component_cls is None:
+            raise ValueError(f"Unknown component type: {comp_type}")
+        
+        kwargs = {}
+        if component_cls is Gate:
             # Check if message bus is enabled for this component
-            mb_config = comp_config.get('message_bus', {})
+            mb_config = comp_config.get('message_bus') or _EMPTY
             if mb_config.get('enabled', False):
-                action_topic = mb_config.get('action_topic', topics['gate_action'])
-                components[name] = Gate(
-                    name=name,
-                    initial_state=initial_state,
-                    parameters=parameters,
-                    message_bus=message_bus,
-                    action_topic=action_topic
-                )
-            else:
-                components[name] = Gate(
-                    name=name,
-                    initial_state=initial_state,
-                    parameters=parameters
-                )
-        else:
-            raise ValueError(f"Unknown component type: {comp_type}")
+                kwargs['message_bus'] = message_bus
+                kwargs['action_topic'] = mb_config.get('action_topic', gate_action_topic)
+        
+        components[name] = component_cls(
+            name=name,
+            initial_state=initial_state,
+            parameters=parameters,
+            **kwargs
+        )
     
     return components
 
@@ -75,6 +106,13 @@ def create_agents(config, components, message_bus):
     """Create agents based on configuration."""
     agents = []
     topics = config['communication']['topics']
+    reservoir_state_topic = topics['reservoir_state']
+    gate_action_topic = topics['gate_action']
+    dt = config['simulation']['dt']
+    debug_config = config.get('debug') or _EMPTY
+    debug_enabled = debug_config.get('enabled', False)
+    debug_interval = debug_config.get('log_interval')
+    debug_topic = topics['digital_twin_state'] if debug_enabled else None
     
     for agent_name, agent_config in config['agents'].items():
         agent_type = agent_config['type']
@@ -88,45 +126,19 @@ def create_agents(config, components, message_bus):
                 agent_id=agent_id,
                 simulated_object=simulated_object,
                 message_bus=message_bus,
-                state_topic=topics['reservoir_state']  # 使用正确的主题
+                state_topic=reservoir_state_topic  # 使用正确的主题
             )
             agents.append(agent)
             
         elif agent_type == 'UnifiedGateControlAgent':
             # Create controller
             controller_config = agent_config['controller']
-            if controller_config['type'] == 'PIDController':
-                params = controller_config['parameters']
-                controller = PIDController(
-                    Kp=params['Kp'],
-                    Ki=params['Ki'],
-                    Kd=params['Kd'],
-                    setpoint=params['setpoint'],
-                    min_output=params['min_output'],
-                    max_output=params['max_output']
-                )
-            elif controller_config['type'] == 'AdaptivePIDController':
-                params = controller_config['parameters']
-                controller = AdaptivePIDController(
-                    Kp=params['Kp'],
-                    Ki=params['Ki'],
-                    Kd=params['Kd'],
-                    setpoint=params['setpoint'],
-                    min_output=params['min_output'],
-                    max_output=params['max_output']
-                )
-            elif controller_config['type'] == 'SmartPIDController':
-                params = controller_config['parameters']
-                controller = SmartPIDController(
-                    Kp=params['Kp'],
-                    Ki=params['Ki'],
-                    Kd=params['Kd'],
-                    setpoint=params['setpoint'],
-                    min_output=params['min_output'],
-                    max_output=params['max_output']
-                )
-            else:
-                raise ValueError(f"Unknown controller type: {controller_config['type']}")
+            controller_type = controller_config['type']
+            controller_cls = CONTROLLER_TYPES.get(controller_type)
+            if controller_cls is None:
+                raise ValueError(f"Unknown controller type: {controller_type}")
+            params = controller_config['parameters']
+            controller = controller_cls(**{arg: params[arg] for arg in CONTROLLER_ARGS})
             
             # 增强控制逻辑：增加积分抗饱和和微分滤波
             if hasattr(controller, 'integral_windup_limit'):
@@ -139,19 +151,19 @@ def create_agents(config, components, message_bus):
                 agent_id=agent_id,
                 controller=controller,
                 message_bus=message_bus,
-                observation_topic=topics['reservoir_state'],
+                observation_topic=reservoir_state_topic,
                 observation_key='water_level',
-                action_topic=topics['gate_action'],
-                dt=config['simulation']['dt'],
+                action_topic=gate_action_topic,
+                dt=dt,
                 target_component='gate_1',
                 control_type='water_level_control'
             )
             
-            if config['debug']['enabled']:
+            if debug_enabled:
                 agent.enable_control_logging(
                     enabled=True,
-                    state_topic=topics['digital_twin_state'],
-                    interval=config['debug']['log_interval']
+                    state_topic=debug_topic,
+                    interval=debug_interval
                 )
             agents.append(agent)
             
@@ -160,31 +172,39 @@ def create_agents(config, components, message_bus):
     
     return agents
 
-def extract_simulation_data(history):
-    """Extract data from simulation history for analysis."""
-    time_data = []
-    reservoir_water_level = []
-    reservoir_volume = []
-    gate_opening = []
+# (component, field) pairs pulled out of the harness history
+HISTORY_SCHEMA = {
+    'reservoir_water_level': ('reservoir_1', 'water_level'),
+    'reservoir_volume': ('reservoir_1', 'volume'),
+    'gate_opening': ('gate_1', 'opening'),
+}
+
+def history_to_soa(history, schema):
+    """
+    Convert the per-step history (a list of nested dicts) into one float64
+    array per (component, field) in schema. Steps where a component (or its
+    field) is missing are skipped, so each column holds only the values that
+    were actually recorded and may be shorter than the history.
+    """
+    n = len(history)
+    columns = {key: np.empty(n, dtype=np.float64) for key in schema}
+    counts = dict.fromkeys(schema, 0)
+    fields = [(key, columns[key], component, field) for key, (component, field) in schema.items()]
     
-    for i, step_data in enumerate(history):
-        time_data.append(i)  # Time step index
-        
-        # Extract reservoir data
-        if 'reservoir_1' in step_data:
-            reservoir_water_level.append(step_data['reservoir_1']['water_level'])
-            reservoir_volume.append(step_data['reservoir_1']['volume'])
-        
-        # Extract gate data
-        if 'gate_1' in step_data:
-            gate_opening.append(step_data['gate_1']['opening'])
+    for step_data in history:
+        for key, column, component, field in fields:
+            state = step_data.get(component)
+            if state is not None and field in state:
+                column[counts[key]] = state[field]
+                counts[key] += 1
     
-    return {
-        'time': time_data,
-        'reservoir_water_level': reservoir_water_level,
-        'reservoir_volume': reservoir_volume,
-        'gate_opening': gate_opening
-    }
+    return {key: column[:counts[key]] for key, column in columns.items()}
+
+def extract_simulation_data(history):
+    """Extract data from simulation history for analysis."""
+    data = history_to_soa(history, HISTORY_SCHEMA)
+    data['time'] = np.arange(len(history), dtype=np.int32)  # Time step index
+    return data
 
 def analyze_results(config, data):
     """Analyze simulation results."""
@@ -192,9 +212,9 @@ def analyze_results(config, data):
     
     if config['analysis']['final_state_report']:
         target_level = config['analysis']['target_water_level']
-        final_level = data['reservoir_water_level'][-1] if data['reservoir_water_level'] else 0
-        final_volume = data['reservoir_volume'][-1] if data['reservoir_volume'] else 0
-        final_opening = data['gate_opening'][-1] if data['gate_opening'] else 0
+        final_level = data['reservoir_water_level'][-1] if data['reservoir_water_level'].size else 0
+        final_volume = data['reservoir_volume'][-1] if data['reservoir_volume'].size else 0
+        final_opening = data['gate_opening'][-1] if data['gate_opening'].size else 0
         
         print(f"\n=== Multi-Agent System Performance Analysis ===")
         print(f"Target water level: {target_level:.2f} m")
@@ -213,11 +233,36 @@ def analyze_results(config, data):
         else:
             print("✗ FAIL: Steady-state error is too large (>= 0.5 m)")
 
+def _downsample(x, y, max_points=4000):
+    """
+    Reduce a long series to at most max_points vertices for plotting,
+    keeping the minimum and maximum of each bucket so peaks survive.
+    """
+    y = np.asarray(y)
+    n = len(y)
+    if n <= max_points:
+        return x, y
+    
+    bucket = -(-n // (max_points // 2))
+    n_buckets = -(-n // bucket)
+    padded = np.full(n_buckets * bucket, np.nan)
+    padded[:n] = y
+    padded = padded.reshape(n_buckets, bucket)
+    offsets = np.arange(n_buckets) * bucket
+    idx = np.union1d(np.nanargmin(padded, axis=1) + offsets,
+                     np.nanargmax(padded, axis=1) + offsets)
+    return np.asarray(x)[idx], y[idx]
+
 def generate_plots(config, data):
     """Generate visualization plots."""
     if not config['visualization']['enabled']:
         return
     
+    # Imported here so runs without plots skip matplotlib start-up entirely
+    from plot_backend import use_headless_backend
+    use_headless_backend()
+    import matplotlib.pyplot as plt
+    
     viz_config = config['visualization']
     plots_config = viz_config['plots']
     
@@ -227,8 +272,7 @@ def generate_plots(config, data):
         axes = [axes]
     
     for i, plot_config in enumerate(plots_config):
-        x_data = data[plot_config['x_data']]
-        y_data = data[plot_config['y_data']]
+        x_data, y_data = _downsample(data[plot_config['x_data']], data[plot_config['y_data']])
         
         axes[i].plot(x_data, y_data, 'b-', linewidth=2, label='Actual')
         
@@ -294,9 +338,16 @@ def run_simulation(config):
 
 def main():
     """Main function."""
+    parser = argparse.ArgumentParser(description='Configuration-driven MAS simulation')
+    parser.add_argument('--no-plots', action='store_true',
+                        help='skip plot generation regardless of the visualization config')
+    args = parser.parse_args()
+    
     # Load configuration
     config_path = os.path.join(os.path.dirname(__file__), 'config.yml')
     config = load_config(config_path)
+    if args.no_plots:
+        config['visualization']['enabled'] = False
     
     # Run simulation
     harness = run_simulation(config)
@@ -8,10 +8,14 @@ are fully decoupled and communicate only via a MessageBus.
 
 import sys
 import os
+from dataclasses import dataclass
+from typing import Optional
+import numpy as np
 
 # Add the project root to the Python path
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
 sys.path.insert(0, project_root)
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'shared')))
 
 from core_lib.physical_objects.reservoir import Reservoir
 from core_lib.physical_objects.gate import Gate
@@ -20,10 +24,221 @@ from core_lib.local_agents.control.unified_gate_control_agent import UnifiedGate
 from core_lib.local_agents.perception.digital_twin_agent import DigitalTwinAgent
 from core_lib.core_engine.testing.simulation_harness import SimulationHarness
 from core_lib.central_coordination.collaboration.message_bus import MessageBus
+# numba is optional; without it the scan below runs as plain Python
+from numba_compat import njit
 
-def run_mas_simulation():
+
+@njit(cache=True)
+def scan_settling_and_stability(levels, target, settling_threshold, required_steps,
+                                stable_threshold, window):
+    """
+    Walk the water levels once and return (settling_index, is_stable).
+
+    settling_index is the first step of the first run of `required_steps`
+    consecutive levels within `settling_threshold` of the target, or -1 if
+    the level never settles. is_stable is True when every one of the last
+    `window` levels lies within `stable_threshold` of the target.
+    """
+    n = levels.shape[0]
+    settling_index = -1
+    consecutive = 0
+    is_stable = True
+    window_start = n - window
+    for i in range(n):
+        error = abs(levels[i] - target)
+        if settling_index < 0:
+            if error <= settling_threshold:
+                consecutive += 1
+                if consecutive == required_steps:
+                    settling_index = i - required_steps + 1
+            else:
+                consecutive = 0
+        if i >= window_start and error > stable_threshold:
+            is_stable = False
+    return settling_index, is_stable
+
+
+STABLE_THRESHOLD = 0.1  # m, band for the last-10% stability check
+SETTLING_FRACTION = 0.05  # settle within 5% of target
+SETTLING_STEPS = 10  # Need 10 consecutive steps within threshold to consider settled
+
+
+@dataclass
+class ControlMetrics:
+    """Control performance metrics for one simulation run."""
+    final_error: float
+    mae: float
+    rmse: float
+    max_overshoot: float
+    percent_overshoot: float
+    settling_time: Optional[float]
+    avg_opening: float
+    max_opening: float
+    min_opening: float
+    avg_change: float
+    level_variance: Optional[float]
+    stability_window: int
+    is_stable: bool
+
+
+def evaluate(water_levels, gate_openings, target, dt):
+    """
+    Compute all control performance metrics from the recorded water levels
+    and gate openings. The error arrays are built once and shared by every
+    metric; the settling/stability scan is a single fused pass.
+    """
+    n = len(water_levels)
+    errors = water_levels - target
+    squared_errors = errors * errors
+    
+    # 1-3. Final error, MAE, RMSE
+    final_error = abs(errors[-1]) if n else 0
+    mae = np.abs(errors).mean() if n else 0
+    rmse = np.sqrt(squared_errors.mean()) if n else 0
+    
+    # 4. Overshoot
+    max_overshoot = max(0.0, errors.max()) if n else 0
+    percent_overshoot = (max_overshoot / target) * 100 if target > 0 else 0
+    
+    # 5-6. Stability over the last 10% and settling time
+    stability_window = int(n * 0.1)
+    settling_index, is_stable = scan_settling_and_stability(
+        water_levels, target, SETTLING_FRACTION * target, SETTLING_STEPS,
+        STABLE_THRESHOLD, stability_window
+    )
+    settling_time = settling_index * dt if settling_index >= 0 else None
+    
+    # 7. Control signal statistics
+    openings = np.asarray(gate_openings, dtype=np.float64)
+    if openings.size:
+        avg_opening, max_opening, min_opening = openings.mean(), openings.max(), openings.min()
+        # Calculate control signal changes (absolute differences between consecutive steps)
+        avg_change = np.abs(np.diff(openings)).mean() if openings.size > 1 else 0
+    else:
+        avg_opening = max_opening = min_opening = avg_change = 0
+    
+    # Variance of water levels around the target in the second half
+    level_variance = squared_errors[n // 2:].mean() if n > 1 else None
+    
+    return ControlMetrics(
+        final_error=final_error, mae=mae, rmse=rmse,
+        max_overshoot=max_overshoot, percent_overshoot=percent_overshoot,
+        settling_time=settling_time,
+        avg_opening=avg_opening, max_opening=max_opening,
+        min_opening=min_opening, avg_change=avg_change,
+        level_variance=level_variance,
+        stability_window=stability_window, is_stable=is_stable
+    )
+
+
+class MetricsAccumulator:
+    """
+    Streaming counterpart of evaluate(): consumes one history entry at a
+    time and keeps only running sums, so memory stays constant however long
+    the run is. n_steps is the expected number of steps; the level variance
+    sums the squared errors from step n_steps // 2 onward, which is the
+    second half evaluate() uses when the run has exactly n_steps steps.
+    """
+
+    def __init__(self, target, dt, n_steps):
+        self.target = target
+        self.dt = dt
+        self.second_half_start = n_steps // 2
+        self.settling_threshold = SETTLING_FRACTION * target
+        self.count = 0
+        self.sum_abs = 0.0
+        self.sum_sq = 0.0
+        self.sum_sq_second_half = 0.0
+        self.n_second_half = 0
+        self.max_over = 0.0
+        self.consecutive_settled = 0
+        self.settling_index = -1
+        self.trailing_stable = 0  # length of the current run within STABLE_THRESHOLD
+        self.last_level = None
+        self.n_openings = 0
+        self.sum_opening = 0.0
+        self.max_opening = float('-inf')
+        self.min_opening = float('inf')
+        self.sum_dopening = 0.0
+        self.last_opening = None
+
+    def update(self, step_data):
+        """Fold one history entry into the running metrics."""
+        reservoir = step_data.get('reservoir_1')
+        if reservoir is not None and 'water_level' in reservoir:
+            level = reservoir['water_level']
+            error = level - self.target
+            abs_error = abs(error)
+            sq_error = error * error
+            self.sum_abs += abs_error
+            self.sum_sq += sq_error
+            if self.count >= self.second_half_start:
+                self.sum_sq_second_half += sq_error
+                self.n_second_half += 1
+            if error > self.max_over:
+                self.max_over = error
+            if self.settling_index < 0:
+                if abs_error <= self.settling_threshold:
+                    self.consecutive_settled += 1
+                    if self.consecutive_settled == SETTLING_STEPS:
+                        self.settling_index = self.count - SETTLING_STEPS + 1
+                else:
+                    self.consecutive_settled = 0
+            self.trailing_stable = self.trailing_stable + 1 if abs_error <= STABLE_THRESHOLD else 0
+            self.last_level = level
+            self.count += 1
+        
+        gate = step_data.get('gate_1')
+        if gate is not None and 'opening' in gate:
+            opening = gate['opening']
+            self.sum_opening += opening
+            if opening > self.max_opening:
+                self.max_opening = opening
+            if opening < self.min_opening:
+                self.min_opening = opening
+            if self.last_opening is not None:
+                self.sum_dopening += abs(opening - self.last_opening)
+            self.last_opening = opening
+            self.n_openings += 1
+
+    def finalize(self):
+        """Return the accumulated metrics as a ControlMetrics."""
+        n = self.count
+        if n > 1 and self.n_second_half:
+            level_variance = self.sum_sq_second_half / self.n_second_half
+        else:
+            level_variance = None
+        stability_window = int(n * 0.1)
+        if self.n_openings:
+            avg_opening = self.sum_opening / self.n_openings
+            max_opening, min_opening = self.max_opening, self.min_opening
+            avg_change = self.sum_dopening / (self.n_openings - 1) if self.n_openings > 1 else 0
+        else:
+            avg_opening = max_opening = min_opening = avg_change = 0
+        return ControlMetrics(
+            final_error=abs(self.last_level - self.target) if self.last_level is not None else 0,
+            mae=self.sum_abs / n if n else 0,
+            rmse=(self.sum_sq / n) ** 0.5 if n else 0,
+            max_overshoot=self.max_over,
+            percent_overshoot=(self.max_over / self.target) * 100 if self.target > 0 else 0,
+            settling_time=self.settling_index * self.dt if self.settling_index >= 0 else None,
+            avg_opening=avg_opening, max_opening=max_opening,
+            min_opening=min_opening, avg_change=avg_change,
+            level_variance=level_variance,
+            stability_window=stability_window,
+            is_stable=self.trailing_stable >= stability_window
+        )
+
+
+def run_mas_simulation(stream_metrics=False):
     """
     Sets up and runs the multi-agent system simulation.
+
+    By default harness.history is kept for further inspection. With
+    stream_metrics=True the harness still runs its own loop, but after every
+    physical step the component states are folded into a MetricsAccumulator
+    and harness.history is cleared, so it never holds more than the latest
+    step.
     """
     print("--- Setting up Tutorial 3: Event-Driven Agents Simulation ---")
 
@@ -111,106 +326,74 @@ def run_mas_simulation():
     harness.build()
 
     # 6. --- Run Simulation ---
+    target_level = 12.0  # Target water level from PID controller
     print("\n--- Running MAS Simulation ---")
+    if stream_metrics:
+        accumulator = MetricsAccumulator(
+            target_level, harness.dt, int(simulation_config['end_time'] / simulation_config['dt'])
+        )
+        history = harness.history
+        step_physical_models = harness._step_physical_models
+
+        # Wrap the physical step the same way StateRecorder does: fold the new
+        # states into the accumulator and drop the history built up so far
+        def accumulating_step(dt, controller_actions=None):
+            result = step_physical_models(dt, controller_actions)
+            accumulator.update({'reservoir_1': reservoir.get_state(), 'gate_1': gate.get_state()})
+            history.clear()
+            return result
+
+        harness._step_physical_models = accumulating_step
     harness.run_mas_simulation()
+    if stream_metrics:
+        history.clear()
+        final_level = accumulator.last_level
+    else:
+        final_level = harness.history[-1]['reservoir_1']['water_level']
     print("\n--- Simulation Complete ---")
 
-    # Note: In a real script, you would likely process or view the results.
-    # For this example, we just confirm completion.
-    # The data is in harness.history.
-    print(f"Final reservoir water level: {harness.history[-1]['reservoir_1']['water_level']:.2f} m")
+    print(f"Final reservoir water level: {final_level:.2f} m")
 
     # --- Evaluate Control Performance ---
     print("\n--- Control Performance Evaluation ---")
     
-    # Extract water level and gate opening data from history
-    target_level = 12.0  # Target water level from PID controller
-    water_levels = []
-    gate_openings = []
-    
-    for step in harness.history:
-        if 'reservoir_1' in step and 'water_level' in step['reservoir_1']:
-            water_levels.append(step['reservoir_1']['water_level'])
-        if 'gate_1' in step and 'opening' in step['gate_1']:
-            gate_openings.append(step['gate_1']['opening'])
-    
-    # Calculate evaluation metrics
-    # 1. Final Control Error (FCE)
-    final_error = abs(water_levels[-1] - target_level)
-    
-    # 2. Mean Absolute Error (MAE)
-    absolute_errors = [abs(level - target_level) for level in water_levels]
-    mae = sum(absolute_errors) / len(absolute_errors) if absolute_errors else 0
-    
-    # 3. Root Mean Square Error (RMSE)
-    squared_errors = [(level - target_level) ** 2 for level in water_levels]
-    rmse = (sum(squared_errors) / len(squared_errors)) ** 0.5 if squared_errors else 0
-    
-    # 4. Overshoot
-    overshoots = [level - target_level for level in water_levels if level > target_level]
-    max_overshoot = max(overshoots) if overshoots else 0
-    percent_overshoot = (max_overshoot / target_level) * 100 if target_level > 0 else 0
-    
-    # 5. Stability analysis
-    # Check if system is stable (water level within 0.1m of target for last 10% of simulation)
-    stable_threshold = 0.1  # m
-    stability_check_window = int(len(water_levels) * 0.1)
-    
-    # 6. Settling time - time to reach within 5% of target and stay there
-    settling_time = None
-    settling_threshold = 0.05 * target_level  # 5% of target
-    consecutive_stable_steps = 0
-    required_consecutive_steps = 10  # Need 10 consecutive steps within threshold to consider settled
-    
-    for i, level in enumerate(water_levels):
-        if abs(level - target_level) <= settling_threshold:
-            consecutive_stable_steps += 1
-        else:
-            consecutive_stable_steps = 0
-        
-        if consecutive_stable_steps == required_consecutive_steps:
-            settling_time = (i - required_consecutive_steps + 1) * simulation_config['dt']
-            break
-    
-    # 7. Control signal statistics
-    if gate_openings:
-        avg_opening = sum(gate_openings) / len(gate_openings)
-        max_opening = max(gate_openings)
-        min_opening = min(gate_openings)
-        # Calculate control signal changes (absolute differences between consecutive steps)
-        if len(gate_openings) > 1:
-            control_changes = [abs(gate_openings[i] - gate_openings[i-1]) for i in range(1, len(gate_openings))]
-            avg_change = sum(control_changes) / len(control_changes) if control_changes else 0
-        else:
-            avg_change = 0
+    if stream_metrics:
+        metrics = accumulator.finalize()
     else:
-        avg_opening = max_opening = min_opening = avg_change = 0
+        # Extract water level and gate opening data from history
+        history = harness.history
+        water_levels = np.empty(len(history), dtype=np.float64)
+        gate_openings = np.empty(len(history), dtype=np.float64)
+        n_levels = n_openings = 0
+        
+        for step in history:
+            if 'reservoir_1' in step and 'water_level' in step['reservoir_1']:
+                water_levels[n_levels] = step['reservoir_1']['water_level']
+                n_levels += 1
+            if 'gate_1' in step and 'opening' in step['gate_1']:
+                gate_openings[n_openings] = step['gate_1']['opening']
+                n_openings += 1
+        water_levels = water_levels[:n_levels]
+        gate_openings = gate_openings[:n_openings]
+        
+        metrics = evaluate(water_levels, gate_openings, target_level, simulation_config['dt'])
     
     # Print evaluation results
     print(f"Target water level: {target_level:.2f} m")
-    print(f"1. Final Control Error (FCE): {final_error:.4f} m")
-    print(f"2. Mean Absolute Error (MAE): {mae:.4f} m")
-    print(f"3. Root Mean Square Error (RMSE): {rmse:.4f} m")
-    print(f"4. Max Overshoot: {max_overshoot:.4f} m ({percent_overshoot:.2f}%)")
-    print(f"5. Settling Time: {settling_time:.1f} s" if settling_time is not None else "5. System did not settle within simulation time")
-    print(f"6. Gate Opening Stats - Avg: {avg_opening:.3f}, Max: {max_opening:.3f}, Min: {min_opening:.3f}, Avg Change: {avg_change:.4f}")
+    print(f"1. Final Control Error (FCE): {metrics.final_error:.4f} m")
+    print(f"2. Mean Absolute Error (MAE): {metrics.mae:.4f} m")
+    print(f"3. Root Mean Square Error (RMSE): {metrics.rmse:.4f} m")
+    print(f"4. Max Overshoot: {metrics.max_overshoot:.4f} m ({metrics.percent_overshoot:.2f}%)")
+    print(f"5. Settling Time: {metrics.settling_time:.1f} s" if metrics.settling_time is not None else "5. System did not settle within simulation time")
+    print(f"6. Gate Opening Stats - Avg: {metrics.avg_opening:.3f}, Max: {metrics.max_opening:.3f}, Min: {metrics.min_opening:.3f}, Avg Change: {metrics.avg_change:.4f}")
     
     # Advanced stability analysis
-    # Calculate variance of water levels in the second half of the simulation
-    if len(water_levels) > 1:
-        second_half_levels = water_levels[len(water_levels)//2:]
-        level_variance = sum((l - target_level)**2 for l in second_half_levels) / len(second_half_levels)
-        print(f"7. Level Variance (second half): {level_variance:.6f}")
-        
-        # Determine if system is stable in the last 10% of simulation
-        if stability_check_window > 0:
-            last_10_percent = water_levels[-stability_check_window:]
-            is_stable = all(abs(l - target_level) <= stable_threshold for l in last_10_percent)
-            print(f"8. System Stable in Last 10%: {is_stable}")
-    if stability_check_window > 0:
-        recent_errors = [abs(level - target_level) for level in water_levels[-stability_check_window:]]
-        is_stable = all(error <= stable_threshold for error in recent_errors)
-        print(f"Stability: {'Stable' if is_stable else 'Not Stable'} (within {stable_threshold}m for last {stability_check_window} steps)")
+    if metrics.level_variance is not None:
+        print(f"7. Level Variance (second half): {metrics.level_variance:.6f}")
+        if metrics.stability_window > 0:
+            print(f"8. System Stable in Last 10%: {metrics.is_stable}")
+    if metrics.stability_window > 0:
+        print(f"Stability: {'Stable' if metrics.is_stable else 'Not Stable'} (within {STABLE_THRESHOLD}m for last {metrics.stability_window} steps)")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+指标计算与绘图降采样的测试
+
+- run_mas_simulation.evaluate 与流式的 MetricsAccumulator 对同一段记录给出相同指标
+- run_config._downsample 降采样后保留序列的极值
+"""
+
+import numpy as np
+import pytest
+
+
+@pytest.fixture(scope='module')
+def mas(load_example):
+    return load_example('03_event_driven_agents/run_mas_simulation.py')
+
+
+@pytest.fixture(scope='module')
+def run_config(load_example):
+    return load_example('03_event_driven_agents/run_config.py')
+
+
+def _damped_levels(n, target=12.0):
+    """从14 m衰减振荡收敛到目标水位的水位序列，带少量噪声"""
+    rng = np.random.default_rng(n)
+    t = np.arange(n, dtype=np.float64)
+    return target + 2.0 * np.exp(-t / 40.0) * np.cos(t / 6.0) + rng.normal(0.0, 0.01, n)
+
+
+@pytest.mark.parametrize('n', [0, 1, 2, 37, 400])
+def test_accumulator_matches_evaluate(mas, n):
+    target, dt = 12.0, 0.5
+    levels = _damped_levels(n, target)
+    openings = np.clip(np.linspace(0.1, 0.9, n), 0.0, 1.0)
+
+    accumulator = mas.MetricsAccumulator(target, dt, n)
+    for level, opening in zip(levels, openings):
+        accumulator.update({'reservoir_1': {'water_level': level}, 'gate_1': {'opening': opening}})
+
+    streamed = accumulator.finalize()
+    batch = mas.evaluate(levels, openings, target, dt)
+    for field in ('final_error', 'mae', 'rmse', 'max_overshoot', 'percent_overshoot',
+                  'avg_opening', 'max_opening', 'min_opening', 'avg_change'):
+        assert getattr(streamed, field) == pytest.approx(getattr(batch, field)), field
+    assert streamed.settling_time == batch.settling_time
+    assert streamed.stability_window == batch.stability_window
+    assert streamed.is_stable == batch.is_stable
+    if batch.level_variance is None:
+        assert streamed.level_variance is None
+    else:
+        assert streamed.level_variance == pytest.approx(batch.level_variance)
+
+
+def test_downsample_keeps_extremes(run_config):
+    rng = np.random.default_rng(0)
+    n = 50_000
+    x = np.arange(n) * 0.5
+    y = rng.normal(12.0, 0.1, n)
+    y[1234] = 20.0  # 尖峰
+    y[40000] = 3.0  # 低谷
+
+    xs, ys = run_config._downsample(x, y, max_points=1000)
+
+    assert len(ys) <= 1000
+    assert ys.max() == y.max() and ys.min() == y.min()
+    assert 1234 * 0.5 in xs and 40000 * 0.5 in xs
+    # 采样点保持时间顺序，且都是原序列中的点
+    assert np.all(np.diff(xs) > 0)
+    np.testing.assert_array_equal(ys, y[(xs / 0.5).astype(int)])
+
+
+def test_downsample_short_series_unchanged(run_config):
+    x = np.arange(10.0)
+    y = np.linspace(0.0, 1.0, 10)
+    xs, ys = run_config._downsample(x, y, max_points=100)
+    np.testing.assert_array_equal(xs, x)
+    np.testing.assert_array_equal(ys, y)
@@ -6,37 +6,116 @@
 
 import sys
 import os
+import argparse
+import time
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
 
 from core_lib.local_agents.control.pid_controller import PIDController
 
-def test_pid_controller():
+# PID控制器参数 (PIDController 与 numba 单步计算共用)
+PID_CONFIG = {'Kp': 10.0, 'Ki': 1.0, 'Kd': 0.0, 'setpoint': 12.0, 'min_output': 0.0, 'max_output': 1.0}
+
+# --numba 计时对比的步数
+BENCH_STEPS = 100000
+
+def _pid_step(kp, ki, kd, sp, pv, integral, prev_err, dt, lo, hi):
+    """
+    单步PID计算（位置式，输出限幅），返回 (控制量, 新积分项, 新误差)
+    """
+    error = sp - pv
+    integral = integral + error * dt
+    derivative = (error - prev_err) / dt
+    u = kp * error + ki * integral + kd * derivative
+    if u < lo:
+        u = lo
+    elif u > hi:
+        u = hi
+    return u, integral, error
+
+def _compile_pid_step():
+    """
+    用numba编译 _pid_step（numba为可选依赖，仅 --numba 模式需要），未安装时返回None；
+    cache=True 将机器码缓存到 __pycache__，再次运行时跳过编译
+    """
+    try:
+        from numba import njit
+    except ImportError:
+        return None
+    return njit('UniTuple(float64, 3)(' + ', '.join(['float64'] * 10) + ')', cache=True)(_pid_step)
+
+def test_pid_controller(use_numba=False):
     """
     测试PID控制器的基本功能
+
+    use_numba为True时，同时用numba编译的 _pid_step 计算控制量并与PIDController对比，
+    作为控制器重写的回归基线，并计时对比两种实现（见 benchmark_pid）。
     """
     print("=== PID Controller Test ===")
     
     # 创建PID控制器
-    pid = PIDController(
-        Kp=10.0,
-        Ki=1.0,
-        Kd=0.0,
-        setpoint=12.0,
-        min_output=0.0,
-        max_output=1.0
-    )
+    pid = PIDController(**PID_CONFIG)
     
     # 测试不同的水位值
     test_levels = [14.0, 13.0, 12.5, 12.0, 11.5, 11.0]
     dt = 0.5
     
+    if use_numba:
+        compile_start = time.perf_counter()
+        pid_step_jit = _compile_pid_step()
+        compile_time = time.perf_counter() - compile_start
+        if pid_step_jit is None:
+            print("numba 未安装，跳过 --numba 对比")
+            use_numba = False
+        gains = (PID_CONFIG['Kp'], PID_CONFIG['Ki'], PID_CONFIG['Kd'], PID_CONFIG['setpoint'])
+        limits = (PID_CONFIG['min_output'], PID_CONFIG['max_output'])
+    integral = prev_err = 0.0
+    
     for level in test_levels:
         observation = {'process_variable': level}
         control_signal = pid.compute_control_action(observation, dt)
         error = pid.setpoint - level
         print(f"Level: {level:.1f}m, Error: {error:.1f}, Control Signal: {control_signal:.4f}")
+        
+        if use_numba:
+            jit_signal, integral, prev_err = pid_step_jit(*gains, level, integral, prev_err, dt, *limits)
+            match = abs(jit_signal - control_signal) < 1e-9
+            print(f"    numba: {jit_signal:.4f} ({'一致' if match else '不一致'})")
+    
+    if use_numba:
+        benchmark_pid(pid_step_jit, compile_time, dt)
     
     print("\n=== Test Complete ===")
 
+def benchmark_pid(pid_step_jit, compile_time, dt, n_steps=BENCH_STEPS):
+    """
+    用 time.perf_counter 计时：PIDController.compute_control_action 与numba编译的
+    _pid_step 各运行n_steps步（水位在测试水位之间循环）；编译耗时单独列出，不计入步进耗时
+    """
+    levels = [14.0, 13.0, 12.5, 12.0, 11.5, 11.0]
+    levels = (levels * (n_steps // len(levels) + 1))[:n_steps]
+    
+    pid = PIDController(**PID_CONFIG)
+    start = time.perf_counter()
+    for level in levels:
+        pid.compute_control_action({'process_variable': level}, dt)
+    pid_time = time.perf_counter() - start
+    
+    gains = (PID_CONFIG['Kp'], PID_CONFIG['Ki'], PID_CONFIG['Kd'], PID_CONFIG['setpoint'])
+    limits = (PID_CONFIG['min_output'], PID_CONFIG['max_output'])
+    integral = prev_err = 0.0
+    start = time.perf_counter()
+    for level in levels:
+        _, integral, prev_err = pid_step_jit(*gains, level, integral, prev_err, dt, *limits)
+    jit_time = time.perf_counter() - start
+    
+    print(f"\n=== 计时 ({n_steps} 步) ===")
+    print(f"numba 编译: {compile_time * 1e3:.1f} ms (cache=True 命中缓存时为加载耗时)")
+    print(f"PIDController: {pid_time * 1e3:.1f} ms ({pid_time / n_steps * 1e6:.2f} us/步)")
+    print(f"numba _pid_step: {jit_time * 1e3:.1f} ms ({jit_time / n_steps * 1e6:.2f} us/步)")
+
 if __name__ == "__main__":
-    test_pid_controller()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='PID控制器测试')
+    parser.add_argument('--numba', action='store_true',
+                        help='同时运行numba编译的PID单步计算并对比输出')
+    args = parser.parse_args()
+    test_pid_controller(use_numba=args.numba)
\ No newline at end of file
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+分层控制示例的快速仿真路径
+
+把水库质量守恒、闸门出流 Q = Cd * w * e * sqrt(2gh)、调度规则和PID更新写成
+一个纯标量循环；安装了numba时以 @njit(cache=True, fastmath=True) 编译。
+
+这是core_lib组件的简化近似（线性库容曲线、恒定入流 inflow、闸门开度速率限制、
+标准位置式PID），用于长时长仿真和参数试算，不替代多智能体框架的结果。
+分层控制示例的水库没有入流，run_fast_loop 传入 inflow=0.0（只靠闸门泄流）。
+"""
+
+import os
+import sys
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'shared')))
+
+# numba为可选依赖；未安装时 run_loop 以纯Python运行
+from numba_compat import njit
+
+GRAVITY = 9.81
+
+
+@njit(cache=True, fastmath=True)
+def run_loop(n_steps, dt, volume, level_per_volume, inflow,
+             opening, discharge_coefficient, width, max_opening, max_rate_of_change,
+             Kp, Ki, Kd, low_level, high_level, low_setpoint, high_setpoint):
+    """
+    运行耦合的 水库 + 闸门 + 调度 + PID 模型，返回 (水位, 闸门开度) 数组
+
+    调度规则：水位高于high_level切换到high_setpoint（防洪），低于low_level
+    恢复low_setpoint；PID在水位高于设定值时开大闸门。
+    """
+    water_levels = np.empty(n_steps)
+    openings = np.empty(n_steps)
+    setpoint = low_setpoint
+    integral = 0.0
+    prev_error = 0.0
+    max_step = max_rate_of_change * dt
+
+    for i in range(n_steps):
+        level = volume * level_per_volume
+
+        # 上层调度：根据水位切换设定值
+        if level > high_level:
+            setpoint = high_setpoint
+        elif level < low_level:
+            setpoint = low_setpoint
+
+        # 下层PID：输出为目标开度
+        error = level - setpoint
+        integral += error * dt
+        derivative = (error - prev_error) / dt if i > 0 else 0.0
+        prev_error = error
+        target = Kp * error + Ki * integral + Kd * derivative
+        if target < 0.0:
+            target = 0.0
+        elif target > max_opening:
+            target = max_opening
+
+        # 闸门开度速率限制
+        if target > opening + max_step:
+            opening += max_step
+        elif target < opening - max_step:
+            opening -= max_step
+        else:
+            opening = target
+
+        # 闸门出流与水库质量守恒
+        outflow = discharge_coefficient * width * opening * np.sqrt(2.0 * GRAVITY * level) if level > 0.0 else 0.0
+        volume += (inflow - outflow) * dt
+        if volume < 0.0:
+            volume = 0.0
+
+        water_levels[i] = volume * level_per_volume
+        openings[i] = opening
+
+    return water_levels, openings
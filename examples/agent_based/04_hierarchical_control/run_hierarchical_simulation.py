@@ -8,12 +8,13 @@ supervisory agent manages the objectives of a low-level, local controller.
 
 import sys
 import os
-import matplotlib.pyplot as plt
-import numpy as np
+import argparse
 
 # Add the project root to the Python path
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
-sys.path.insert(0, project_root)
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'shared')))
 
 from core_lib.physical_objects.reservoir import Reservoir
 from core_lib.physical_objects.gate import Gate
@@ -22,6 +23,20 @@ from core_lib.local_agents.control.unified_gate_control_agent import UnifiedGate
 from core_lib.local_agents.perception.digital_twin_agent import DigitalTwinAgent
 from core_lib.central_coordination.dispatch.central_dispatcher import CentralDispatcherAgent
 from core_lib.core_engine.testing.simulation_harness import SimulationHarness
+from state_recorder import StateRecorder
+
+from hierarchical_analysis import analyze, extract_series
+
+# 通信主题：模块加载时驻留(intern)，发布/订阅时的字典查找可走指针比较
+RESERVOIR_STATE_TOPIC = sys.intern("state.reservoir.level")
+GATE_STATE_TOPIC = sys.intern("state.gate.gate_1")
+GATE_ACTION_TOPIC = sys.intern("action.gate.opening")
+GATE_COMMAND_TOPIC = sys.intern("command.gate1.setpoint")
+
+
+# 仿真记录的 (组件ID, 状态字段)
+RECORDED_FIELDS = [('reservoir_1', 'water_level'), ('gate_1', 'opening')]
+
 
 def setup_hierarchical_control_system(harness):
     """
@@ -32,12 +47,6 @@ def setup_hierarchical_control_system(harness):
     message_bus = harness.message_bus
     simulation_dt = harness.dt
 
-    # --- Communication Topics ---
-    RESERVOIR_STATE_TOPIC = "state.reservoir.level"
-    GATE_STATE_TOPIC = "state.gate.gate_1"
-    GATE_ACTION_TOPIC = "action.gate.opening"
-    GATE_COMMAND_TOPIC = "command.gate1.setpoint"
-
     # --- Physical Components ---
     reservoir = Reservoir(
         name="reservoir_1",
@@ -95,22 +104,7 @@ def setup_hierarchical_control_system(harness):
     )
 
     # --- Central Dispatcher with Corrected Message Key ---
-    dispatcher_rules = {
-        "profiles": {
-            "flood_control": {
-                "condition": lambda states: states.get('reservoir_level', {}).get('water_level', 0) > 18.0,
-                "commands": {
-                    "gate1_command": {'new_setpoint': 12.0}
-                }
-            },
-            "normal_operation": {
-                "condition": lambda states: True,
-                "commands": {
-                    "gate1_command": {'new_setpoint': 15.0}
-                }
-            }
-        }
-    }
+    # 规则模式完全由 dispatcher_params 的数值阈值驱动，无需lambda规则
     dispatcher = CentralDispatcherAgent(
         agent_id="dispatcher_1",
         message_bus=message_bus,
@@ -136,96 +130,29 @@ def setup_hierarchical_control_system(harness):
     harness.add_connection("reservoir_1", "gate_1")
 
 
-def analyze_and_visualize_results(harness, simulation_config):
+def analyze_and_visualize_results(harness, simulation_config, recorder=None, plot=True):
     """
     分析和可视化分层控制系统的结果
+
+    提供recorder时直接读取其结构化数组，否则从harness.history提取
     """
     print("\n--- Analyzing Hierarchical Control Results ---")
     
-    # 提取数据
-    time_data = []
-    water_levels = []
-    gate_openings = []
-    setpoints = []
-    
-    for i, step_data in enumerate(harness.history):
-        time_data.append(i * simulation_config['dt'])
-        
-        if 'reservoir_1' in step_data:
-            water_levels.append(step_data['reservoir_1']['water_level'])
-        else:
-            water_levels.append(0)
-            
-        if 'gate_1' in step_data:
-            gate_openings.append(step_data['gate_1']['opening'])
-        else:
-            gate_openings.append(0)
-        
-        # 假设目标水位为15.0m（正常操作）或12.0m（防洪）
-        target_level = 15.0 if water_levels[-1] <= 18.0 else 12.0
-        setpoints.append(target_level)
-    
-    # 计算控制性能指标
-    target_level = 15.0  # 主要目标
-    final_error = abs(water_levels[-1] - target_level)
-    mae = np.mean([abs(level - target_level) for level in water_levels])
-    rmse = np.sqrt(np.mean([(level - target_level)**2 for level in water_levels]))
-    
-    print(f"=== Control Performance Analysis ===")
-    print(f"Target water level: {target_level:.2f} m")
-    print(f"Final water level: {water_levels[-1]:.2f} m")
-    print(f"Final gate opening: {gate_openings[-1]:.3f}")
-    print(f"Final control error: {final_error:.3f} m")
-    print(f"Mean Absolute Error (MAE): {mae:.3f} m")
-    print(f"Root Mean Square Error (RMSE): {rmse:.3f} m")
-    
-    # 检查分层控制效果
-    print(f"\n=== Hierarchical Control Analysis ===")
-    high_level_periods = sum(1 for level in water_levels if level > 18.0)
-    print(f"High water level periods (>18m): {high_level_periods} steps")
-    print(f"Flood control activation: {'Yes' if high_level_periods > 0 else 'No'}")
-    
-    # 创建可视化图表
-    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 10))
-    
-    # 水位控制图
-    ax1.plot(time_data, water_levels, 'b-', linewidth=2, label='Actual Water Level')
-    ax1.plot(time_data, setpoints, 'r--', linewidth=2, label='Target Setpoint')
-    ax1.axhline(y=18.0, color='orange', linestyle=':', linewidth=2, label='Flood Control Threshold')
-    ax1.set_title('Hierarchical Control: Water Level Response', fontsize=14, fontweight='bold')
-    ax1.set_xlabel('Time (s)', fontsize=12)
-    ax1.set_ylabel('Water Level (m)', fontsize=12)
-    ax1.legend()
-    ax1.grid(True, alpha=0.3)
-    
-    # 闸门开度图
-    ax2.plot(time_data, gate_openings, 'g-', linewidth=2, label='Gate Opening')
-    ax2.set_title('Gate Opening Response', fontsize=14, fontweight='bold')
-    ax2.set_xlabel('Time (s)', fontsize=12)
-    ax2.set_ylabel('Gate Opening', fontsize=12)
-    ax2.legend()
-    ax2.grid(True, alpha=0.3)
-    
-    plt.tight_layout()
-    
-    # 保存图表
-    save_path = '04_hierarchical_control_results.png'
-    plt.savefig(save_path, dpi=300, bbox_inches='tight')
-    print(f"\nResults visualization saved as '{save_path}'")
-    
-    plt.show()
+    if recorder is not None:
+        # 直接使用记录器的结构化数组列，零拷贝
+        water_levels, gate_openings = recorder.series()
+    else:
+        water_levels, gate_openings = extract_series(harness.history)
     
-    return {
-        'final_error': final_error,
-        'mae': mae,
-        'rmse': rmse,
-        'flood_control_activated': high_level_periods > 0
-    }
+    return analyze(water_levels, gate_openings, simulation_config['dt'],
+                   '04_hierarchical_control_results.png', plot=plot)
 
 
-def run_hierarchical_simulation():
+def run_hierarchical_simulation(plot=True):
     """
     Sets up and runs the full hierarchical simulation.
+
+    With plot=False only the numeric analysis is printed and matplotlib is never imported.
     """
     print("\n--- Setting up Tutorial 4: Hierarchical Control Simulation ---")
 
@@ -235,18 +162,23 @@ def run_hierarchical_simulation():
     setup_hierarchical_control_system(harness)
 
     harness.build()
+    recorder = StateRecorder(
+        harness, RECORDED_FIELDS, int(simulation_config['end_time'] / simulation_config['dt']) + 1
+    )
 
     print("\n--- Running Hierarchical Simulation ---")
     harness.run_mas_simulation()
     print("\n--- Simulation Complete ---")
 
-    final_level = harness.history[-1]['reservoir_1']['water_level']
-    final_opening = harness.history[-1]['gate_1']['opening']
+    # 最终值取自记录器的列视图
+    water_levels, gate_openings = recorder.series()
+    final_level = water_levels[-1]
+    final_opening = gate_openings[-1]
     print(f"Final reservoir water level: {final_level:.2f} m")
     print(f"Final gate opening: {final_opening:.2f} m")
     
     # 分析和可视化结果
-    results = analyze_and_visualize_results(harness, simulation_config)
+    results = analyze_and_visualize_results(harness, simulation_config, recorder, plot=plot)
     
     # 验证控制正确性
     print(f"\n=== Control Correctness Verification ===")
@@ -264,4 +196,8 @@ def run_hierarchical_simulation():
 
 
 if __name__ == "__main__":
-    run_hierarchical_simulation()
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--no-plot', action='store_true',
+                        help='print the numeric analysis only, skip plotting')
+    args = parser.parse_args()
+    run_hierarchical_simulation(plot=not args.no_plot)
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+复杂网络示例的共享记录布局与结果分析
+
+run_branched_network_simulation.py 与 run_branched_network_simulation_refactored.py
+共用此模块，两个脚本只在历史数据来源、标题和保存路径上不同。
+
+matplotlib 只在绘图时才导入；后端选择见 shared/plot_backend.py，无图形界面时
+使用非交互的Agg后端并跳过 plt.show()。
+"""
+
+import os
+import sys
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'shared')))
+
+# 结果分析只读取这些 (组件ID, 状态字段)，由 StateRecorder 记录；trib_chan、main_chan、
+# g3 等中间节点不进入记录器（harness.history 仍照常记录全部组件），诊断时可在此追加
+RECORDED_FIELDS = [
+    ('res1', 'water_level'),
+    ('res2', 'water_level'),
+    ('g1', 'opening'),
+    ('g2', 'opening'),
+]
+
+# 各水库的目标水位 (m)
+TARGET_RES1 = 12.0
+TARGET_RES2 = 18.0
+
+
+# 水位(0-30 m)和开度(0-2)按float32记录即可满足绘图和三位小数的指标输出，
+# 仿真内部状态仍为float64，只在写入时转换
+RECORDED_DTYPE = 'f4'
+
+
+def analyze_network_control(res1_levels, res2_levels, g1_openings, g2_openings, dt,
+                            save_path, title_suffix='', targets=(TARGET_RES1, TARGET_RES2)):
+    """
+    分析和可视化复杂网络控制系统的结果
+
+    title_suffix 追加到水位图和总结图的标题（重构版脚本使用 ' (Refactored)'）；
+    targets 为 (水库1, 水库2) 的目标水位，参数扫描时随设定值传入。
+    """
+    n = res1_levels.shape[0]
+    time_data = np.arange(n, dtype=np.float64) * dt
+
+    # 计算控制性能指标：每个水库只分配一个误差缓冲区，原地求差和绝对值，
+    # MAE、最终误差和误差曲线共用
+    target_res1, target_res2 = targets
+
+    errors_res1 = np.subtract(res1_levels, target_res1, out=np.empty_like(res1_levels))
+    np.abs(errors_res1, out=errors_res1)
+    errors_res2 = np.subtract(res2_levels, target_res2, out=np.empty_like(res2_levels))
+    np.abs(errors_res2, out=errors_res2)
+
+    # 误差数组保持输入精度，最终误差和累加结果提升为float64
+    final_error_res1 = np.float64(errors_res1[-1])
+    final_error_res2 = np.float64(errors_res2[-1])
+
+    mae_res1 = errors_res1.mean(dtype=np.float64)
+    mae_res2 = errors_res2.mean(dtype=np.float64)
+
+    print(f"=== Control Performance Analysis ===")
+    print(f"Reservoir 1 - Target: {target_res1:.1f}m, Final: {res1_levels[-1]:.2f}m, Error: {final_error_res1:.3f}m, MAE: {mae_res1:.3f}m")
+    print(f"Reservoir 2 - Target: {target_res2:.1f}m, Final: {res2_levels[-1]:.2f}m, Error: {final_error_res2:.3f}m, MAE: {mae_res2:.3f}m")
+
+    _plot(time_data, res1_levels, res2_levels, g1_openings, g2_openings,
+          errors_res1, errors_res2,
+          targets, ((final_error_res1, mae_res1), (final_error_res2, mae_res2)),
+          save_path, title_suffix)
+
+    return {
+        'res1_error': final_error_res1,
+        'res2_error': final_error_res2,
+        'res1_mae': mae_res1,
+        'res2_mae': mae_res2
+    }
+
+
+# 结果图缓存：title_suffix -> (fig, axes, lines, texts)；重复分析时复用同一Figure
+_RESULT_FIGURES = {}
+
+
+def _get_result_figure(title_suffix):
+    """创建结果图的Figure、Axes、曲线和总结文字对象，之后的调用直接复用"""
+    cached = _RESULT_FIGURES.get(title_suffix)
+    if cached is not None:
+        return cached
+
+    from plot_backend import use_headless_backend
+    use_headless_backend()
+    import matplotlib.pyplot as plt
+
+    fig, ((ax1, ax2), (ax3, ax4)) = plt.subplots(2, 2, figsize=(15, 12))
+    lines = {}
+    texts = {}
+
+    # 1. 水库水位控制图
+    lines['res1_level'], = ax1.plot([], [], 'b-', linewidth=2, label='Reservoir 1 Level')
+    lines['res2_level'], = ax1.plot([], [], 'r-', linewidth=2, label='Reservoir 2 Level')
+    lines['res1_target'] = ax1.axhline(y=TARGET_RES1, color='blue', linestyle='--', linewidth=2, label='Res1 Target')
+    lines['res2_target'] = ax1.axhline(y=TARGET_RES2, color='red', linestyle='--', linewidth=2, label='Res2 Target')
+    ax1.set_title(f'Reservoir Water Level Control{title_suffix}', fontsize=14, fontweight='bold')
+    ax1.set_xlabel('Time (s)', fontsize=12)
+    ax1.set_ylabel('Water Level (m)', fontsize=12)
+    ax1.legend()
+    ax1.grid(True, alpha=0.3)
+
+    # 2. 闸门开度图
+    lines['g1_opening'], = ax2.plot([], [], 'g-', linewidth=2, label='Gate 1 Opening')
+    lines['g2_opening'], = ax2.plot([], [], 'orange', linewidth=2, label='Gate 2 Opening')
+    ax2.set_title('Gate Opening Response', fontsize=14, fontweight='bold')
+    ax2.set_xlabel('Time (s)', fontsize=12)
+    ax2.set_ylabel('Gate Opening', fontsize=12)
+    ax2.legend()
+    ax2.grid(True, alpha=0.3)
+
+    # 3. 控制误差图
+    lines['res1_error'], = ax3.plot([], [], 'b-', linewidth=2, label='Res1 Error')
+    lines['res2_error'], = ax3.plot([], [], 'r-', linewidth=2, label='Res2 Error')
+    ax3.axhline(y=1.0, color='orange', linestyle='--', linewidth=2, label='Acceptable Error')
+    ax3.set_title('Control Error Over Time', fontsize=14, fontweight='bold')
+    ax3.set_xlabel('Time (s)', fontsize=12)
+    ax3.set_ylabel('Absolute Error (m)', fontsize=12)
+    ax3.legend()
+    ax3.grid(True, alpha=0.3)
+
+    # 4. 控制性能总结：标题固定，数值行在每次绘图时更新
+    for key, label, top in (('res1', 'Reservoir 1 Control:', 0.95), ('res2', 'Reservoir 2 Control:', 0.45)):
+        ax4.text(0.05, top, label, transform=ax4.transAxes, fontsize=12, fontweight='bold')
+        texts[key] = [ax4.text(0.05, top - 0.1 * (k + 1), '', transform=ax4.transAxes, fontsize=11)
+                      for k in range(3)]
+
+    ax4.set_title(f'Control Performance Summary{title_suffix}', fontsize=14, fontweight='bold')
+    ax4.set_xlim(0, 1)
+    ax4.set_ylim(0, 1)
+    ax4.axis('off')
+
+    fig.tight_layout()
+
+    _RESULT_FIGURES[title_suffix] = (fig, (ax1, ax2, ax3), lines, texts)
+    return _RESULT_FIGURES[title_suffix]
+
+
+def _plot(time_data, res1_levels, res2_levels, g1_openings, g2_openings,
+          errors_res1, errors_res2, targets, summary, save_path, title_suffix):
+    """绘制结果图；summary为 ((res1最终误差, res1 MAE), (res2最终误差, res2 MAE))"""
+    fig, axes, lines, texts = _get_result_figure(title_suffix)
+
+    # 只更新曲线数据，坐标轴范围随数据重新计算
+    lines['res1_level'].set_data(time_data, res1_levels)
+    lines['res2_level'].set_data(time_data, res2_levels)
+    lines['g1_opening'].set_data(time_data, g1_openings)
+    lines['g2_opening'].set_data(time_data, g2_openings)
+    lines['res1_error'].set_data(time_data, errors_res1)
+    lines['res2_error'].set_data(time_data, errors_res2)
+    lines['res1_target'].set_ydata([targets[0], targets[0]])
+    lines['res2_target'].set_ydata([targets[1], targets[1]])
+    for ax in axes:
+        ax.relim()
+        ax.autoscale_view()
+
+    for key, (final_error, mae) in zip(('res1', 'res2'), summary):
+        final_text, mae_text, status_text = texts[key]
+        final_text.set_text(f'  Final Error: {final_error:.3f} m')
+        mae_text.set_text(f'  MAE: {mae:.3f} m')
+        status_text.set_text(f'  Status: {"✓ Good" if final_error < 1.0 else "✗ Poor"}')
+
+    # 保存图表：曲线图用矢量PDF保存，无需光栅化；若save_path为位图格式则用100 dpi
+    fig.savefig(save_path, dpi=100, bbox_inches='tight')
+    print(f"\nResults visualization saved as '{save_path}'")
+
+    from plot_backend import show_enabled
+    if show_enabled():
+        import matplotlib.pyplot as plt
+        plt.show()
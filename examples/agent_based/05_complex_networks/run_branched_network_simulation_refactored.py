@@ -8,147 +8,60 @@ of a complex, branched network topology.
 
 import sys
 import os
-import matplotlib.pyplot as plt
-import numpy as np
 
 # Add the project root to the Python path
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
 sys.path.insert(0, project_root)
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'shared')))
 
 from core_lib.core_engine.testing.simulation_builder import SimulationBuilder
+from core_lib.physical_objects.gate import Gate
 from core_lib.physical_objects.river_channel import RiverChannel
 from core_lib.local_agents.perception.digital_twin_agent import DigitalTwinAgent
 from core_lib.local_agents.control.pid_controller import PIDController
 from core_lib.local_agents.control.unified_gate_control_agent import UnifiedGateControlAgent
 from core_lib.central_coordination.dispatch.central_dispatcher import CentralDispatcherAgent
 
-def analyze_and_visualize_results(builder, config):
+from state_recorder import StateRecorder
+
+from network_analysis import RECORDED_FIELDS, TARGET_RES1, TARGET_RES2, RECORDED_DTYPE, analyze_network_control
+
+# 通信主题：模块加载时驻留(intern)，发布/订阅时的字典查找可走指针比较
+RES1_STATE_TOPIC = sys.intern("state.res1.level")
+RES2_STATE_TOPIC = sys.intern("state.res2.level")
+G1_STATE_TOPIC = sys.intern("state.g1.opening")
+G2_STATE_TOPIC = sys.intern("state.g2.opening")
+G1_ACTION_TOPIC = sys.intern("action.g1.opening")
+G2_ACTION_TOPIC = sys.intern("action.g2.opening")
+RES1_COMMAND_TOPIC = sys.intern("command.res1.setpoint")
+RES2_COMMAND_TOPIC = sys.intern("command.res2.setpoint")
+
+# 默认控制参数：(g1, g2) 的PID增益 (Kp, Ki, Kd) 与 (res1, res2) 的目标水位 (m)
+DEFAULT_PID_GAINS = ((2.0, 0.5, 0.2), (1.5, 0.3, 0.15))
+DEFAULT_SETPOINTS = (TARGET_RES1, TARGET_RES2)
+
+def analyze_and_visualize_results(builder, config, recorder, targets=DEFAULT_SETPOINTS):
     """
     分析和可视化复杂网络控制系统的结果
+
+    数据直接取自recorder的列视图（零拷贝）
     """
     print("\n--- Analyzing Complex Network Control Results (Refactored) ---")
     
-    # 获取历史数据
-    history = builder.get_history()
-    if not history:
+    if recorder.count == 0:
         print("No simulation history available")
         return None
     
-    # 提取数据
-    time_data = []
-    res1_levels = []
-    res2_levels = []
-    g1_openings = []
-    g2_openings = []
-    
-    for i, step_data in enumerate(history):
-        time_data.append(i * config['dt'])
-        
-        if 'res1' in step_data:
-            res1_levels.append(step_data['res1']['water_level'])
-        else:
-            res1_levels.append(0)
-            
-        if 'res2' in step_data:
-            res2_levels.append(step_data['res2']['water_level'])
-        else:
-            res2_levels.append(0)
-            
-        if 'g1' in step_data:
-            g1_openings.append(step_data['g1']['opening'])
-        else:
-            g1_openings.append(0)
-            
-        if 'g2' in step_data:
-            g2_openings.append(step_data['g2']['opening'])
-        else:
-            g2_openings.append(0)
-    
-    # 计算控制性能指标
-    target_res1 = 12.0
-    target_res2 = 18.0
-    
-    final_error_res1 = abs(res1_levels[-1] - target_res1)
-    final_error_res2 = abs(res2_levels[-1] - target_res2)
-    
-    mae_res1 = np.mean([abs(level - target_res1) for level in res1_levels])
-    mae_res2 = np.mean([abs(level - target_res2) for level in res2_levels])
-    
-    print(f"=== Control Performance Analysis ===")
-    print(f"Reservoir 1 - Target: {target_res1:.1f}m, Final: {res1_levels[-1]:.2f}m, Error: {final_error_res1:.3f}m, MAE: {mae_res1:.3f}m")
-    print(f"Reservoir 2 - Target: {target_res2:.1f}m, Final: {res2_levels[-1]:.2f}m, Error: {final_error_res2:.3f}m, MAE: {mae_res2:.3f}m")
-    
-    # 创建可视化图表
-    fig, ((ax1, ax2), (ax3, ax4)) = plt.subplots(2, 2, figsize=(15, 12))
-    
-    # 1. 水库水位控制图
-    ax1.plot(time_data, res1_levels, 'b-', linewidth=2, label='Reservoir 1 Level')
-    ax1.plot(time_data, res2_levels, 'r-', linewidth=2, label='Reservoir 2 Level')
-    ax1.axhline(y=target_res1, color='blue', linestyle='--', linewidth=2, label='Res1 Target')
-    ax1.axhline(y=target_res2, color='red', linestyle='--', linewidth=2, label='Res2 Target')
-    ax1.set_title('Reservoir Water Level Control (Refactored)', fontsize=14, fontweight='bold')
-    ax1.set_xlabel('Time (s)', fontsize=12)
-    ax1.set_ylabel('Water Level (m)', fontsize=12)
-    ax1.legend()
-    ax1.grid(True, alpha=0.3)
-    
-    # 2. 闸门开度图
-    ax2.plot(time_data, g1_openings, 'g-', linewidth=2, label='Gate 1 Opening')
-    ax2.plot(time_data, g2_openings, 'orange', linewidth=2, label='Gate 2 Opening')
-    ax2.set_title('Gate Opening Response', fontsize=14, fontweight='bold')
-    ax2.set_xlabel('Time (s)', fontsize=12)
-    ax2.set_ylabel('Gate Opening', fontsize=12)
-    ax2.legend()
-    ax2.grid(True, alpha=0.3)
-    
-    # 3. 控制误差图
-    errors_res1 = [abs(level - target_res1) for level in res1_levels]
-    errors_res2 = [abs(level - target_res2) for level in res2_levels]
-    ax3.plot(time_data, errors_res1, 'b-', linewidth=2, label='Res1 Error')
-    ax3.plot(time_data, errors_res2, 'r-', linewidth=2, label='Res2 Error')
-    ax3.axhline(y=1.0, color='orange', linestyle='--', linewidth=2, label='Acceptable Error')
-    ax3.set_title('Control Error Over Time', fontsize=14, fontweight='bold')
-    ax3.set_xlabel('Time (s)', fontsize=12)
-    ax3.set_ylabel('Absolute Error (m)', fontsize=12)
-    ax3.legend()
-    ax3.grid(True, alpha=0.3)
-    
-    # 4. 控制性能总结
-    ax4.text(0.05, 0.95, f'Reservoir 1 Control:', transform=ax4.transAxes, fontsize=12, fontweight='bold')
-    ax4.text(0.05, 0.85, f'  Final Error: {final_error_res1:.3f} m', transform=ax4.transAxes, fontsize=11)
-    ax4.text(0.05, 0.75, f'  MAE: {mae_res1:.3f} m', transform=ax4.transAxes, fontsize=11)
-    ax4.text(0.05, 0.65, f'  Status: {"✓ Good" if final_error_res1 < 1.0 else "✗ Poor"}', transform=ax4.transAxes, fontsize=11)
-    
-    ax4.text(0.05, 0.45, f'Reservoir 2 Control:', transform=ax4.transAxes, fontsize=12, fontweight='bold')
-    ax4.text(0.05, 0.35, f'  Final Error: {final_error_res2:.3f} m', transform=ax4.transAxes, fontsize=11)
-    ax4.text(0.05, 0.25, f'  MAE: {mae_res2:.3f} m', transform=ax4.transAxes, fontsize=11)
-    ax4.text(0.05, 0.15, f'  Status: {"✓ Good" if final_error_res2 < 1.0 else "✗ Poor"}', transform=ax4.transAxes, fontsize=11)
-    
-    ax4.set_title('Control Performance Summary (Refactored)', fontsize=14, fontweight='bold')
-    ax4.set_xlim(0, 1)
-    ax4.set_ylim(0, 1)
-    ax4.axis('off')
-    
-    plt.tight_layout()
-    
-    # 保存图表
-    save_path = '05_complex_networks_refactored_results.png'
-    plt.savefig(save_path, dpi=300, bbox_inches='tight')
-    print(f"\nResults visualization saved as '{save_path}'")
-    
-    plt.show()
-    
-    return {
-        'res1_error': final_error_res1,
-        'res2_error': final_error_res2,
-        'res1_mae': mae_res1,
-        'res2_mae': mae_res2
-    }
+    return analyze_network_control(*recorder.series(), config['dt'], '05_complex_networks_refactored_results.pdf', title_suffix=' (Refactored)', targets=targets)
 
-def create_branched_network_system():
+def create_branched_network_system(pid_gains=DEFAULT_PID_GAINS, setpoints=DEFAULT_SETPOINTS):
     """
     Creates a complex branched network system using SimulationBuilder.
     
+    Args:
+        pid_gains: ((Kp, Ki, Kd) for g1, (Kp, Ki, Kd) for g2)
+        setpoints: (res1, res2) target water levels in m
+    
     Returns:
         SimulationBuilder: Configured simulation builder
     """
@@ -174,8 +87,6 @@ def create_branched_network_system():
     )
     
     # 直接创建闸门对象，设置正确的物理参数
-    from core_lib.physical_objects.gate import Gate
-    
     g1 = Gate(
         name="g1",
         initial_state={'opening': 0.1},
@@ -186,7 +97,7 @@ def create_branched_network_system():
             'max_rate_of_change': 0.5
         },
         message_bus=builder.harness.message_bus,
-        action_topic="action.g1.opening",
+        action_topic=G1_ACTION_TOPIC,
         action_key='control_signal'
     )
     builder.harness.add_component("g1", g1)
@@ -201,7 +112,7 @@ def create_branched_network_system():
             'max_rate_of_change': 0.5
         },
         message_bus=builder.harness.message_bus,
-        action_topic="action.g2.opening",
+        action_topic=G2_ACTION_TOPIC,
         action_key='control_signal'
     )
     builder.harness.add_component("g2", g2)
@@ -256,39 +167,40 @@ def create_branched_network_system():
             agent_id="twin_res1",
             simulated_object=builder.harness.components["res1"],
             message_bus=builder.harness.message_bus,
-            state_topic="state.res1.level"
+            state_topic=RES1_STATE_TOPIC
         ),
         DigitalTwinAgent(
             agent_id="twin_g1",
             simulated_object=builder.harness.components["g1"],
             message_bus=builder.harness.message_bus,
-            state_topic="state.g1.opening"
+            state_topic=G1_STATE_TOPIC
         ),
         DigitalTwinAgent(
             agent_id="twin_res2",
             simulated_object=builder.harness.components["res2"],
             message_bus=builder.harness.message_bus,
-            state_topic="state.res2.level"
+            state_topic=RES2_STATE_TOPIC
         ),
         DigitalTwinAgent(
             agent_id="twin_g2",
             simulated_object=builder.harness.components["g2"],
             message_bus=builder.harness.message_bus,
-            state_topic="state.g2.opening"
+            state_topic=G2_STATE_TOPIC
         )
     ]
     
     # Add PID controllers and unified gate control agents
+    (kp1, ki1, kd1), (kp2, ki2, kd2) = pid_gains
     pid1 = PIDController(
-        Kp=2.0, Ki=0.5, Kd=0.2,
-        setpoint=12.0,
+        Kp=kp1, Ki=ki1, Kd=kd1,
+        setpoint=setpoints[0],
         min_output=0.0,
         max_output=2.0
     )
     
     pid2 = PIDController(
-        Kp=1.5, Ki=0.3, Kd=0.15,
-        setpoint=18.0,
+        Kp=kp2, Ki=ki2, Kd=kd2,
+        setpoint=setpoints[1],
         min_output=0.0,
         max_output=2.0
     )
@@ -297,11 +209,11 @@ def create_branched_network_system():
         agent_id="lca_g1",
         controller=pid1,
         message_bus=builder.harness.message_bus,
-        observation_topic="state.res1.level",
+        observation_topic=RES1_STATE_TOPIC,
         observation_key="water_level",
-        action_topic="action.g1.opening",
+        action_topic=G1_ACTION_TOPIC,
         dt=config['dt'],
-        command_topic="command.res1.setpoint",
+        command_topic=RES1_COMMAND_TOPIC,
         target_component="g1",
         control_type="gate_control"
     )
@@ -310,11 +222,11 @@ def create_branched_network_system():
         agent_id="lca_g2",
         controller=pid2,
         message_bus=builder.harness.message_bus,
-        observation_topic="state.res2.level",
+        observation_topic=RES2_STATE_TOPIC,
         observation_key="water_level",
-        action_topic="action.g2.opening",
+        action_topic=G2_ACTION_TOPIC,
         dt=config['dt'],
-        command_topic="command.res2.setpoint",
+        command_topic=RES2_COMMAND_TOPIC,
         target_component="g2",
         control_type="gate_control"
     )
@@ -324,9 +236,9 @@ def create_branched_network_system():
         agent_id="central_dispatcher",
         message_bus=builder.harness.message_bus,
         mode="rule",
-        subscribed_topic="state.res1.level",
+        subscribed_topic=RES1_STATE_TOPIC,
         observation_key="water_level",
-        command_topic="command.res1.setpoint",
+        command_topic=RES1_COMMAND_TOPIC,
         dispatcher_params={
             "low_level": 8.0,
             "high_level": 12.0,
@@ -342,18 +254,23 @@ def create_branched_network_system():
     
     return builder
 
-def run_branched_network_simulation():
+def run_branched_network_simulation(pid_gains=DEFAULT_PID_GAINS, setpoints=DEFAULT_SETPOINTS):
     """
     Sets up and runs the branched network simulation.
+    
+    pid_gains and setpoints are passed to create_branched_network_system, so a
+    parameter sweep can call this once per point and collect the returned metrics.
     """
     print("\n--- Setting up Complex Networks Simulation (Refactored) ---")
     
     # Create the simulation system
-    builder = create_branched_network_system()
+    builder = create_branched_network_system(pid_gains, setpoints)
     
     # Build and run the simulation
     print("\nBuilding simulation harness...")
     builder.build()
+    harness = builder.harness
+    recorder = StateRecorder(harness, RECORDED_FIELDS, int(harness.end_time / harness.dt) + 1, dtype=RECORDED_DTYPE)
     
     print("Running simulation...")
     builder.run_mas_simulation()
@@ -362,17 +279,18 @@ def run_branched_network_simulation():
     # Print final results
     builder.print_final_states()
     
-    # Get specific final values
-    history = builder.get_history()
-    if history:
-        final_res1_level = history[-1]['res1']['water_level']
-        final_res2_level = history[-1]['res2']['water_level']
-        print(f"\nFinal reservoir 1 water level: {final_res1_level:.2f} m (Setpoint: 12.0 m)")
-        print(f"Final reservoir 2 water level: {final_res2_level:.2f} m (Setpoint: 18.0 m)")
+    # Get specific final values (from the recorder, not the full per-component history)
+    if recorder.count:
+        final_res1_level = recorder['res1', 'water_level'][-1]
+        final_res2_level = recorder['res2', 'water_level'][-1]
+        print(f"\nFinal reservoir 1 water level: {final_res1_level:.2f} m (Setpoint: {setpoints[0]:.1f} m)")
+        print(f"Final reservoir 2 water level: {final_res2_level:.2f} m (Setpoint: {setpoints[1]:.1f} m)")
     
     # 分析和可视化结果
     config = {'end_time': 1000, 'dt': 1.0}
-    results = analyze_and_visualize_results(builder, config)
+    results = analyze_and_visualize_results(builder, config, recorder, setpoints)
+    
+    return results
 
 if __name__ == "__main__":
     run_branched_network_simulation()
\ No newline at end of file
@@ -17,12 +17,12 @@
 
 import sys
 import os
-import matplotlib.pyplot as plt
 import numpy as np
 
 # Add the project root to the Python path
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..', '..'))
-sys.path.insert(0, project_root)
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
 
 from core_lib.physical_objects.reservoir import Reservoir
 from core_lib.physical_objects.pump import Pump, PumpStation
@@ -33,6 +33,26 @@ from core_lib.local_agents.analysis.performance_analyzer import ComprehensiveAna
 from core_lib.core_engine.testing.simulation_harness import SimulationHarness
 from core_lib.central_coordination.collaboration.message_bus import MessageBus
 
+from pump_analysis import extract_station_columns
+
+# 水泵规格：(max_flow_rate m³/s, max_head m, power_consumption_kw, efficiency)
+# 合理规格，避免过度设计
+PUMP_SPECS = (
+    (8.0, 25.0, 40, 0.85),   # 小泵
+    (12.0, 30.0, 60, 0.82),  # 中泵
+    (15.0, 20.0, 50, 0.88),  # 大泵
+    (6.0, 35.0, 35, 0.80),   # 小泵
+)
+
+# 需求阶跃：(时刻 s, 需求流量 m³/s)，按时刻升序；需求代理与结果分析共用
+DEMAND_STEPS = (
+    (50, 5.0),
+    (150, 15.0),
+    (300, 25.0),
+    (400, 10.0),
+    (500, 20.0),
+)
+
 def create_advanced_pump_system():
     """创建高级泵站系统 - 使用 core_lib 组件"""
     print("=== Creating Advanced Pump Station System using core_lib Components ===")
@@ -63,20 +83,18 @@ def create_advanced_pump_system():
         parameters={'surface_area': 2.5e6}
     )
     
-    # 创建多台水泵 - 合理规格，避免过度设计
+    # 创建多台水泵 - 规格见 PUMP_SPECS
     pumps = []
-    pump_specs = [
-        {'max_flow_rate': 8.0, 'max_head': 25.0, 'power_consumption_kw': 40, 'efficiency': 0.85},  # 小泵
-        {'max_flow_rate': 12.0, 'max_head': 30.0, 'power_consumption_kw': 60, 'efficiency': 0.82},  # 中泵
-        {'max_flow_rate': 15.0, 'max_head': 20.0, 'power_consumption_kw': 50, 'efficiency': 0.88}, # 大泵
-        {'max_flow_rate': 6.0, 'max_head': 35.0, 'power_consumption_kw': 35, 'efficiency': 0.80}   # 小泵
-    ]
-    
-    for i, specs in enumerate(pump_specs):
+    for i, (max_flow_rate, max_head, power_kw, efficiency) in enumerate(PUMP_SPECS):
         pump = Pump(
             name=f"pump_{i+1}",
             initial_state={'outflow': 0, 'power_draw_kw': 0, 'status': 0},
-            parameters=specs,
+            parameters={
+                'max_flow_rate': max_flow_rate,
+                'max_head': max_head,
+                'power_consumption_kw': power_kw,
+                'efficiency': efficiency
+            },
             message_bus=message_bus,
             action_topic=f"{CONTROL_TOPIC_PREFIX}.pump_{i+1}"
         )
@@ -108,19 +126,11 @@ def create_control_system(message_bus: MessageBus, demand_topic: str,
     print("=== Creating Control System using core_lib Components ===")
     
     # 创建需求代理 - 使用 core_lib 中的需求模式
-    demand_steps = {
-        50: 5.0,    # 5 m³/s at t=50s
-        150: 15.0,  # 15 m³/s at t=150s
-        300: 25.0,  # 25 m³/s at t=300s
-        400: 10.0,  # 10 m³/s at t=400s
-        500: 20.0   # 20 m³/s at t=500s
-    }
-    
     demand_agent = StepDemandPattern(
         agent_id="advanced_demand_agent",
         message_bus=message_bus,
         demand_topic=demand_topic,
-        steps=demand_steps
+        steps=dict(DEMAND_STEPS)
     )
     
     # 创建泵站控制代理 - 使用 core_lib 中的统一控制代理
@@ -139,14 +149,16 @@ def create_control_system(message_bus: MessageBus, demand_topic: str,
 
 def run_advanced_simulation():
     """运行高级仿真 - 使用 core_lib 组件"""
-    print("\n=== Refactored Advanced Pump Station Control System Simulation ===")
-    print("This example demonstrates proper use of core_lib components")
-    print("Learning objectives:")
-    print("1. Understanding how to use existing core_lib components")
-    print("2. Proper system configuration and parameter tuning")
-    print("3. Integration of physical models and control agents")
-    print("4. Best practices for architecture design")
-    print("5. Separation of concerns and single responsibility principle")
+    sys.stdout.write(
+        "\n=== Refactored Advanced Pump Station Control System Simulation ===\n"
+        "This example demonstrates proper use of core_lib components\n"
+        "Learning objectives:\n"
+        "1. Understanding how to use existing core_lib components\n"
+        "2. Proper system configuration and parameter tuning\n"
+        "3. Integration of physical models and control agents\n"
+        "4. Best practices for architecture design\n"
+        "5. Separation of concerns and single responsibility principle\n"
+    )
     
     # 创建系统 - 使用 core_lib 组件
     harness, message_bus, demand_topic, control_topic_prefix, pump_station = create_advanced_pump_system()
@@ -183,110 +195,101 @@ def run_advanced_simulation():
     # 从仿真历史中提取数据
     history = harness.history
     if history:
-        # 创建需求时间表用于分析
-        demand_schedule = {
-            50: 5.0,    # 5 m³/s at t=50s
-            150: 15.0,  # 15 m³/s at t=150s
-            300: 25.0,  # 25 m³/s at t=300s
-            400: 10.0,  # 10 m³/s at t=400s
-            500: 20.0   # 20 m³/s at t=500s
-        }
+        # 一次二分查找得到每一步所处的需求阶段（与需求代理使用同一 DEMAND_STEPS），
+        # 替代逐步排序和线性扫描
+        breakpoints = np.array([t for t, _ in DEMAND_STEPS])
+        values = np.array([demand for _, demand in DEMAND_STEPS])
+        dt = harness.dt
+        times = np.arange(len(history)) * dt
+        idx = np.searchsorted(breakpoints, times, side='right') - 1
+        demands = np.where(idx >= 0, values[np.clip(idx, 0, None)], 0.0)
+        
+        # 从 PumpStation 状态一次性提取聚合数据列
+        flows, powers, running, present = extract_station_columns(history, 'advanced_pump_station')
         
-        for i, step_data in enumerate(history):
-            current_time = i * harness.dt
-            
-            # 根据时间表获取当前需求
-            current_demand = 0.0
-            for time_point in sorted(demand_schedule.keys(), reverse=True):
-                if current_time >= time_point:
-                    current_demand = demand_schedule[time_point]
-                    break
-            
-            # 从泵站状态提取数据
-            if 'advanced_pump_station' in step_data:
-                pump_state = step_data['advanced_pump_station']
-                
-                # 从 PumpStation 状态直接获取聚合数据
-                total_flow = pump_state.get('total_outflow', 0.0)
-                total_power = pump_state.get('total_power_draw_kw', 0.0)
-                running_pumps = pump_state.get('active_pumps', 0)
-                
-                # 记录数据到分析器
-                analyzer.record_data(current_time, {
-                    'demand': current_demand,
-                    'total_flow': total_flow,
-                    'running_pumps': running_pumps,
-                    'total_power': total_power,
-                    'efficiency': 0.8 if total_power > 0 else 0.0
-                })
+        # 效率列整列计算（有功率时按0.8估计），只保留含泵站状态的步
+        efficiencies = np.where(powers > 0.0, 0.8, 0.0)
+        keep = present.nonzero()[0]
+        
+        rows = zip(times[keep].tolist(), demands[keep].tolist(), flows[keep].tolist(),
+                   powers[keep].tolist(), running[keep].tolist(), efficiencies[keep].tolist())
+        record_data = analyzer.record_data
+        for current_time, current_demand, total_flow, total_power, running_pumps, efficiency in rows:
+            # 记录数据到分析器
+            record_data(current_time, {
+                'demand': current_demand,
+                'total_flow': total_flow,
+                'running_pumps': running_pumps,
+                'total_power': total_power,
+                'efficiency': efficiency
+            })
     
     # 执行综合分析
     system_info = {'total_pumps': len(pump_station.pumps)}
     performance = analyzer.analyze_all(system_info)
     
     # 显示分析结果
-    print("\n=== Control Performance Analysis ===")
     control_perf = performance.get('control_performance', {})
-    print(f"Mean Flow Error: {control_perf.get('mean_flow_error', 0):.3f} m³/s")
-    print(f"Maximum Flow Error: {control_perf.get('max_flow_error', 0):.3f} m³/s")
-    print(f"Flow RMSE: {control_perf.get('flow_rmse', 0):.3f} m³/s")
-    print(f"Control Accuracy: {control_perf.get('control_accuracy', 0):.3f}")
-    
-    print("\n=== Energy Performance Analysis ===")
     energy_perf = performance.get('energy_performance', {})
-    print(f"Average Power: {energy_perf.get('average_power', 0):.1f} kW")
-    print(f"Total Energy: {energy_perf.get('total_energy', 0):.1f} kWh")
-    print(f"Average Efficiency: {energy_perf.get('average_efficiency', 0):.3f}")
-    print(f"Energy per Unit Flow: {energy_perf.get('energy_per_unit_flow', 0):.3f} kWh/m³")
-    
-    print("\n=== Utilization Analysis ===")
     util_perf = performance.get('utilization', {})
-    print(f"Pump Utilization: {util_perf.get('pump_utilization', 0):.2f}")
-    print(f"Max Utilization: {util_perf.get('max_utilization', 0):.2f}")
-    print(f"Utilization Variance: {util_perf.get('utilization_variance', 0):.3f}")
+    sys.stdout.write(
+        "\n=== Control Performance Analysis ===\n"
+        f"Mean Flow Error: {control_perf.get('mean_flow_error', 0):.3f} m³/s\n"
+        f"Maximum Flow Error: {control_perf.get('max_flow_error', 0):.3f} m³/s\n"
+        f"Flow RMSE: {control_perf.get('flow_rmse', 0):.3f} m³/s\n"
+        f"Control Accuracy: {control_perf.get('control_accuracy', 0):.3f}\n"
+        "\n=== Energy Performance Analysis ===\n"
+        f"Average Power: {energy_perf.get('average_power', 0):.1f} kW\n"
+        f"Total Energy: {energy_perf.get('total_energy', 0):.1f} kWh\n"
+        f"Average Efficiency: {energy_perf.get('average_efficiency', 0):.3f}\n"
+        f"Energy per Unit Flow: {energy_perf.get('energy_per_unit_flow', 0):.3f} kWh/m³\n"
+        "\n=== Utilization Analysis ===\n"
+        f"Pump Utilization: {util_perf.get('pump_utilization', 0):.2f}\n"
+        f"Max Utilization: {util_perf.get('max_utilization', 0):.2f}\n"
+        f"Utilization Variance: {util_perf.get('utilization_variance', 0):.3f}\n"
+    )
     
     # 绘制结果 - 使用 core_lib 中的绘图功能
     analyzer.plot_results("advanced_pump_station_refactored_results.png")
     
-    print("\n=== Simulation Complete ===")
-    print("Key Learning Points:")
-    print("1. Use existing core_lib components instead of redefining classes")
-    print("2. Separate concerns: demand generation, control logic, and analysis")
-    print("3. Follow single responsibility principle for each component")
-    print("4. Maintain architectural consistency across the system")
-    print("5. Leverage the unified architecture for better maintainability")
+    sys.stdout.write(
+        "\n=== Simulation Complete ===\n"
+        "Key Learning Points:\n"
+        "1. Use existing core_lib components instead of redefining classes\n"
+        "2. Separate concerns: demand generation, control logic, and analysis\n"
+        "3. Follow single responsibility principle for each component\n"
+        "4. Maintain architectural consistency across the system\n"
+        "5. Leverage the unified architecture for better maintainability\n"
+    )
     
     return performance
 
 def demonstrate_architecture_benefits():
     """演示架构设计的好处"""
-    print("\n=== Architecture Design Benefits Demonstration ===")
-    
-    print("\n1. 一致性 (Consistency):")
-    print("✅ 所有组件都遵循统一的接口设计")
-    print("✅ 消息格式和通信协议一致")
-    print("✅ 配置参数命名规范统一")
-    
-    print("\n2. 解耦性 (Decoupling):")
-    print("✅ 需求生成与控制系统解耦")
-    print("✅ 控制策略与物理模型解耦")
-    print("✅ 性能分析与控制逻辑解耦")
-    
-    print("\n3. 单一职责 (Single Responsibility):")
-    print("✅ DemandPattern: 只负责需求生成")
-    print("✅ PumpControlStrategy: 只负责控制算法")
-    print("✅ PerformanceAnalyzer: 只负责性能分析")
-    print("✅ UnifiedPumpStationControlAgent: 只负责控制协调")
-    
-    print("\n4. 可扩展性 (Extensibility):")
-    print("✅ 可以轻松添加新的需求模式")
-    print("✅ 可以轻松添加新的控制策略")
-    print("✅ 可以轻松添加新的分析功能")
-    
-    print("\n5. 可维护性 (Maintainability):")
-    print("✅ 每个组件职责明确，易于理解和修改")
-    print("✅ 组件间依赖关系清晰，降低维护成本")
-    print("✅ 统一的错误处理和日志记录")
+    sys.stdout.write(
+        "\n=== Architecture Design Benefits Demonstration ===\n"
+        "\n1. 一致性 (Consistency):\n"
+        "✅ 所有组件都遵循统一的接口设计\n"
+        "✅ 消息格式和通信协议一致\n"
+        "✅ 配置参数命名规范统一\n"
+        "\n2. 解耦性 (Decoupling):\n"
+        "✅ 需求生成与控制系统解耦\n"
+        "✅ 控制策略与物理模型解耦\n"
+        "✅ 性能分析与控制逻辑解耦\n"
+        "\n3. 单一职责 (Single Responsibility):\n"
+        "✅ DemandPattern: 只负责需求生成\n"
+        "✅ PumpControlStrategy: 只负责控制算法\n"
+        "✅ PerformanceAnalyzer: 只负责性能分析\n"
+        "✅ UnifiedPumpStationControlAgent: 只负责控制协调\n"
+        "\n4. 可扩展性 (Extensibility):\n"
+        "✅ 可以轻松添加新的需求模式\n"
+        "✅ 可以轻松添加新的控制策略\n"
+        "✅ 可以轻松添加新的分析功能\n"
+        "\n5. 可维护性 (Maintainability):\n"
+        "✅ 每个组件职责明确，易于理解和修改\n"
+        "✅ 组件间依赖关系清晰，降低维护成本\n"
+        "✅ 统一的错误处理和日志记录\n"
+    )
 
 if __name__ == "__main__":
     # 运行重构版仿真
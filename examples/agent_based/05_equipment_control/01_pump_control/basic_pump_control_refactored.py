@@ -17,12 +17,14 @@
 
 import sys
 import os
-import matplotlib.pyplot as plt
+import logging
 import numpy as np
 
 # Add the project root to the Python path
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..', '..'))
-sys.path.insert(0, project_root)
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'shared')))
 
 from core_lib.physical_objects.reservoir import Reservoir
 from core_lib.physical_objects.pump import Pump, PumpStation
@@ -32,6 +34,10 @@ from core_lib.core_engine.testing.simulation_harness import SimulationHarness
 from core_lib.core.interfaces import Agent
 from core_lib.central_coordination.collaboration.message_bus import MessageBus
 
+from pump_analysis import extract_station_columns
+
+log = logging.getLogger(__name__)
+
 # 最小化的需求代理 - 仅用于演示
 class SimpleDemandAgent(Agent):
     """简单的需求代理 - 仅用于教学演示"""
@@ -46,13 +52,25 @@ class SimpleDemandAgent(Agent):
             300: 8.0,  # 8 m³/s at t=300s
             450: 20.0  # 20 m³/s at t=450s
         }
+        # 按时间排序的切换时刻和需求值，run() 用游标只比较下一个切换时刻
+        self._times = tuple(sorted(self.demand_schedule))
+        self._values = tuple(self.demand_schedule[t] for t in self._times)
+        self._next = 0
         
     def run(self, current_time: float):
         """根据时间表发布需求"""
-        if int(current_time) in self.demand_schedule:
-            demand = self.demand_schedule[int(current_time)]
-            print(f"--- DEMAND CHANGE: New demand at t={current_time:.0f}s: {demand} m³/s ---")
+        t = int(current_time)
+        times = self._times
+        i = self._next
+        # 已经错过的切换时刻直接跳过（与按时刻精确匹配的行为一致）
+        while i < len(times) and times[i] < t:
+            i += 1
+        if i < len(times) and times[i] == t:
+            demand = self._values[i]
+            log.info("--- DEMAND CHANGE: New demand at t=%.0fs: %s m³/s ---", current_time, demand)
             self.bus.publish(self.demand_topic, {'value': demand})
+            i += 1
+        self._next = i
 
 def create_pump_system():
     """创建水泵系统 - 使用 core_lib 组件"""
@@ -158,54 +176,55 @@ def analyze_results(harness: SimulationHarness):
         print("No simulation history available")
         return
     
-    # 提取数据 - 使用现有的数据结构
-    time_data = []
-    demand_data = []
-    flow_data = []
-    power_data = []
+    # 提取数据 - 单次遍历得到泵站状态列，缺失的步记为0
+    flow_data, power_data, _, _ = extract_station_columns(history, 'pump_station_1')
+    n = flow_data.shape[0]
+    time_data = np.arange(n) * harness.dt
     
-    for i, step_data in enumerate(history):
-        time_data.append(i * harness.dt)
-        
-        # 从泵站状态提取数据
-        if 'pump_station_1' in step_data:
-            pump_state = step_data['pump_station_1']
-            flow_data.append(pump_state.get('total_outflow', 0))
-            power_data.append(pump_state.get('total_power_draw_kw', 0))
-        else:
-            flow_data.append(0)
-            power_data.append(0)
-        
-        # 需求数据（简化处理）
-        demand_data.append(10.0)  # 简化需求模式
+    # 需求数据（简化处理）
+    demand_data = np.full(n, 10.0)  # 简化需求模式
     
     # 计算性能指标
-    if flow_data:
+    if n:
         avg_flow = np.mean(flow_data)
         avg_power = np.mean(power_data)
         max_flow = np.max(flow_data)
         
-        print(f"Performance Analysis:")
-        print(f"  Average Flow: {avg_flow:.2f} m³/s")
-        print(f"  Maximum Flow: {max_flow:.2f} m³/s")
-        print(f"  Average Power: {avg_power:.2f} kW")
+        sys.stdout.write(
+            "Performance Analysis:\n"
+            f"  Average Flow: {avg_flow:.2f} m³/s\n"
+            f"  Maximum Flow: {max_flow:.2f} m³/s\n"
+            f"  Average Power: {avg_power:.2f} kW\n"
+        )
         
         # 绘制结果
         plot_results(time_data, demand_data, flow_data, power_data)
     
     return {
-        'avg_flow': avg_flow if flow_data else 0,
-        'avg_power': avg_power if power_data else 0,
-        'max_flow': max_flow if flow_data else 0
+        'avg_flow': avg_flow if n else 0,
+        'avg_power': avg_power if n else 0,
+        'max_flow': max_flow if n else 0
     }
 
-def plot_results(time_data, demand_data, flow_data, power_data):
-    """绘制结果 - 简化版本"""
+# 结果图缓存：(fig, axes, lines)；matplotlib 在第一次绘图时才导入，重复运行时复用同一Figure
+_RESULT_FIGURE = None
+
+def _get_result_figure():
+    """创建结果图的Figure、Axes和曲线对象，之后的调用直接复用"""
+    global _RESULT_FIGURE
+    if _RESULT_FIGURE is not None:
+        return _RESULT_FIGURE
+    
+    from plot_backend import use_headless_backend
+    use_headless_backend()
+    import matplotlib.pyplot as plt
+    
     fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 8))
+    lines = {}
     
     # 流量响应
-    ax1.plot(time_data, demand_data, 'r--', linewidth=2, label='Demand')
-    ax1.plot(time_data, flow_data, 'b-', linewidth=2, label='Actual Flow')
+    lines['demand'], = ax1.plot([], [], 'r--', linewidth=2, label='Demand')
+    lines['flow'], = ax1.plot([], [], 'b-', linewidth=2, label='Actual Flow')
     ax1.set_title('Pump Flow Control Response', fontsize=14, fontweight='bold')
     ax1.set_xlabel('Time (s)')
     ax1.set_ylabel('Flow Rate (m³/s)')
@@ -213,27 +232,50 @@ def plot_results(time_data, demand_data, flow_data, power_data):
     ax1.grid(True, alpha=0.3)
     
     # 功率消耗
-    ax2.plot(time_data, power_data, 'purple', linewidth=2, label='Power Consumption')
+    lines['power'], = ax2.plot([], [], 'purple', linewidth=2, label='Power Consumption')
     ax2.set_title('Power Consumption', fontsize=14, fontweight='bold')
     ax2.set_xlabel('Time (s)')
     ax2.set_ylabel('Power (kW)')
     ax2.legend()
     ax2.grid(True, alpha=0.3)
     
-    plt.tight_layout()
-    plt.savefig("basic_pump_control_refactored_results.png", dpi=300, bbox_inches='tight')
+    fig.tight_layout()
+    
+    _RESULT_FIGURE = (fig, (ax1, ax2), lines)
+    return _RESULT_FIGURE
+
+def plot_results(time_data, demand_data, flow_data, power_data):
+    """绘制结果 - 简化版本"""
+    fig, axes, lines = _get_result_figure()
+    
+    # 只更新曲线数据，坐标轴范围随数据重新计算
+    lines['demand'].set_data(time_data, demand_data)
+    lines['flow'].set_data(time_data, flow_data)
+    lines['power'].set_data(time_data, power_data)
+    for ax in axes:
+        ax.relim()
+        ax.autoscale_view()
+    
+    fig.savefig("basic_pump_control_refactored_results.png", dpi=150)
     print("Results saved to basic_pump_control_refactored_results.png")
-    plt.show()
+    
+    # 非交互后端（无图形界面或 MPLBACKEND=Agg）下不调用 show()
+    from plot_backend import show_enabled
+    if show_enabled():
+        import matplotlib.pyplot as plt
+        plt.show()
 
 def run_refactored_simulation():
     """运行重构版仿真"""
-    print("\n=== Refactored Basic Pump Control System Simulation ===")
-    print("This example demonstrates proper use of core_lib components")
-    print("Learning objectives:")
-    print("1. Understanding how to use existing core_lib components")
-    print("2. Proper system configuration and parameter tuning")
-    print("3. Integration of physical models and control agents")
-    print("4. Best practices for architecture design")
+    sys.stdout.write(
+        "\n=== Refactored Basic Pump Control System Simulation ===\n"
+        "This example demonstrates proper use of core_lib components\n"
+        "Learning objectives:\n"
+        "1. Understanding how to use existing core_lib components\n"
+        "2. Proper system configuration and parameter tuning\n"
+        "3. Integration of physical models and control agents\n"
+        "4. Best practices for architecture design\n"
+    )
     
     # 创建系统 - 使用 core_lib 组件
     harness, message_bus, demand_topic, control_topic_prefix, pump_station = create_pump_system()
@@ -254,14 +296,18 @@ def run_refactored_simulation():
     # 分析结果
     performance = analyze_results(harness)
     
-    print("\n=== Simulation Complete ===")
-    print("Key Learning Points:")
-    print("1. Use existing core_lib components instead of redefining classes")
-    print("2. Configure components through parameters, not custom code")
-    print("3. Leverage the unified architecture for consistency")
-    print("4. Focus on system integration rather than implementation details")
+    sys.stdout.write(
+        "\n=== Simulation Complete ===\n"
+        "Key Learning Points:\n"
+        "1. Use existing core_lib components instead of redefining classes\n"
+        "2. Configure components through parameters, not custom code\n"
+        "3. Leverage the unified architecture for consistency\n"
+        "4. Focus on system integration rather than implementation details\n"
+    )
     
     return performance
 
 if __name__ == "__main__":
+    # 需求变化等运行日志走logging，基准测试时可调高级别静音
+    logging.basicConfig(level=logging.INFO, format='%(message)s', stream=sys.stdout)
     performance = run_refactored_simulation()
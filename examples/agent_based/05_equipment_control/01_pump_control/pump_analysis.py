@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+泵站示例的共享结果提取
+
+advanced_pump_station.py 与 basic_pump_control_refactored.py 共用此模块，
+把逐步的嵌套字典历史一次性转换为按列存放的NumPy数组。
+"""
+
+import numpy as np
+
+
+def extract_station_columns(history, component_name):
+    """
+    单次遍历仿真历史，把泵站的总流量、总功率和运行台数写入预分配的数组
+
+    返回 (total_flow, total_power, running_pumps, present)；present 标记该步
+    历史中是否含有泵站状态，缺失的步各列记为0。
+    """
+    n = len(history)
+    total_flow = np.zeros(n, dtype=np.float64)
+    total_power = np.zeros(n, dtype=np.float64)
+    running_pumps = np.zeros(n, dtype=np.int32)
+    present = np.zeros(n, dtype=bool)
+
+    for i, step_data in enumerate(history):
+        pump_state = step_data.get(component_name)
+        if pump_state is not None:
+            total_flow[i] = pump_state.get('total_outflow', 0.0)
+            total_power[i] = pump_state.get('total_power_draw_kw', 0.0)
+            running_pumps[i] = pump_state.get('active_pumps', 0)
+            present[i] = True
+
+    return total_flow, total_power, running_pumps, present
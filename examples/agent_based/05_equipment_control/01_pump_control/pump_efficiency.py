@@ -17,16 +17,19 @@
 
 import sys
 import os
-import matplotlib.pyplot as plt
+import argparse
+import bisect
+import logging
 import numpy as np
 from typing import Dict, List, Tuple, Optional
 from dataclasses import dataclass
-from scipy.optimize import minimize_scalar
 import pandas as pd
 
 # Add the project root to the Python path
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..', '..'))
-sys.path.insert(0, project_root)
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'shared')))
 
 from core_lib.physical_objects.reservoir import Reservoir
 from core_lib.physical_objects.pump import Pump, PumpStation
@@ -35,9 +38,63 @@ from core_lib.local_agents.control.unified_pump_control_agent import UnifiedPump
 from core_lib.core_engine.testing.simulation_harness import SimulationHarness
 from core_lib.core.interfaces import Agent
 
-@dataclass
+# 模型和代理的逐步跟踪信息走logging的DEBUG级别，默认不输出
+log = logging.getLogger(__name__)
+
+# numba为可选依赖；未安装时下面的特性曲线函数以纯Python运行
+from numba_compat import njit
+
+@njit(cache=True, fastmath=True)
+def flow_efficiency_curve(flow_ratio, peak_ratio):
+    """流量效率特性曲线"""
+    if flow_ratio <= peak_ratio:
+        # 上升段
+        return 0.3 + 0.7 * (flow_ratio / peak_ratio)
+    # 下降段
+    return 1.0 - 0.3 * ((flow_ratio - peak_ratio) / (1.0 - peak_ratio))
+
+@njit(cache=True, fastmath=True)
+def head_efficiency_curve(head_ratio):
+    """扬程效率特性曲线"""
+    if head_ratio < 0.5:
+        return 0.5 + head_ratio
+    elif head_ratio <= 1.0:
+        return 1.0
+    return max(0.7, 1.0 - 0.3 * (head_ratio - 1.0))
+
+@njit(cache=True, fastmath=True)
+def speed_efficiency_curve(speed_ratio):
+    """转速效率特性曲线"""
+    if speed_ratio < 0.3:
+        return 0.5 + 0.5 * speed_ratio / 0.3
+    elif speed_ratio <= 1.0:
+        return 1.0
+    return max(0.8, 1.0 - 0.2 * (speed_ratio - 1.0))
+
+@njit(cache=True, fastmath=True)
+def pump_efficiency(flow_ratio, head_ratio, speed_ratio, peak_flow_ratio, peak_efficiency):
+    """
+    由归一化的流量、扬程、转速计算综合效率；流量比超出 [0.1, 1.0] 时为0
+
+    三条特性曲线在同一个函数内求值，编译后一次调用完成
+    """
+    if flow_ratio < 0.1 or flow_ratio > 1.0:
+        return 0.0
+    total_efficiency = (flow_efficiency_curve(flow_ratio, peak_flow_ratio)
+                        * head_efficiency_curve(head_ratio)
+                        * speed_efficiency_curve(speed_ratio))
+    return min(total_efficiency, peak_efficiency)
+
+@njit(cache=True, fastmath=True)
+def pump_power(flow, head, efficiency):
+    """功率消耗 (kW)；效率非正时为0"""
+    if efficiency <= 0:
+        return 0.0
+    return (flow * head * 9.81 * 1000) / (efficiency * 1000)
+
+@dataclass(frozen=True)
 class EfficiencyPoint:
-    """效率点数据类"""
+    """效率点数据类（不可变，缓存的最优运行点可安全共享）"""
     flow: float
     head: float
     efficiency: float
@@ -60,6 +117,13 @@ class PumpEfficiencyModel:
             'flow_range': [0.1, 1.0],  # 有效流量范围
             'head_range': [0.5, 1.0]   # 有效扬程范围
         }
+        # 效率计算每次都要用到的参数，构造后不变，存为属性以免反复按键查字典
+        self._peak_efficiency = self.efficiency_params['peak_efficiency']
+        self._peak_flow_ratio = self.efficiency_params['peak_flow_ratio']
+        
+        # 最优运行点缓存：(流量, 扬程) -> EfficiencyPoint，按精确值作键，每个模型实例独立；
+        # 模型参数构造后不再变化，缓存无需失效
+        self._optimal_points = {}
         
     def calculate_efficiency(self, flow: float, head: float, speed: float) -> float:
         """计算水泵效率"""
@@ -68,80 +132,102 @@ class PumpEfficiencyModel:
         head_ratio = head / self.max_head
         speed_ratio = speed / self.max_speed
         
-        print(f"[EfficiencyModel] Flow={flow}, Head={head}, Speed={speed}")
-        print(f"[EfficiencyModel] Ratios: flow={flow_ratio:.3f}, head={head_ratio:.3f}, speed={speed_ratio:.3f}")
-        
-        # 效率计算（基于实际水泵特性）
-        if flow_ratio < 0.1 or flow_ratio > 1.0:
-            print(f"[EfficiencyModel] Flow ratio {flow_ratio:.3f} out of range [0.1, 1.0], returning 0")
-            return 0.0
-            
-        # 流量效率特性
-        flow_efficiency = self._flow_efficiency_curve(flow_ratio)
+        # 每次效率计算的跟踪信息（教学演示用），仅在本模块日志级别为DEBUG时生成
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("[EfficiencyModel] Flow=%s, Head=%s, Speed=%s", flow, head, speed)
+            log.debug("[EfficiencyModel] Ratios: flow=%.3f, head=%.3f, speed=%.3f", flow_ratio, head_ratio, speed_ratio)
+            if flow_ratio < 0.1 or flow_ratio > 1.0:
+                log.debug("[EfficiencyModel] Flow ratio %.3f out of range [0.1, 1.0], returning 0", flow_ratio)
+        
+        # 效率计算（基于实际水泵特性）：流量、扬程、转速效率特性的乘积
+        return pump_efficiency(flow_ratio, head_ratio, speed_ratio,
+                               self._peak_flow_ratio, self._peak_efficiency)
+        
+    def calculate_efficiency_batch(self, flow, head, speed) -> np.ndarray:
+        """
+        calculate_efficiency 的数组版本：flow、head、speed 可为数组或标量（按NumPy
+        广播），分段特性曲线用 np.where 整列计算，适合转速扫描和批量工况评估
+        """
+        flow_ratio = np.asarray(flow, dtype=np.float64) / self.max_flow
+        head_ratio = np.asarray(head, dtype=np.float64) / self.max_head
+        speed_ratio = np.asarray(speed, dtype=np.float64) / self.max_speed
+        peak_ratio = self._peak_flow_ratio
+        
+        # 流量效率特性：峰值前上升，峰值后下降
+        flow_efficiency = np.where(
+            flow_ratio <= peak_ratio,
+            0.3 + 0.7 * (flow_ratio / peak_ratio),
+            1.0 - 0.3 * ((flow_ratio - peak_ratio) / (1.0 - peak_ratio))
+        )
         
-        # 扬程效率特性
-        head_efficiency = self._head_efficiency_curve(head_ratio)
+        # 扬程效率特性：低扬程线性上升，[0.5, 1.0] 为平台，超扬程下降且不低于0.7
+        head_efficiency = np.where(
+            head_ratio < 0.5,
+            0.5 + head_ratio,
+            np.where(head_ratio <= 1.0, 1.0, np.maximum(0.7, 1.0 - 0.3 * (head_ratio - 1.0)))
+        )
         
-        # 转速效率特性
-        speed_efficiency = self._speed_efficiency_curve(speed_ratio)
+        # 转速效率特性：低转速线性上升，[0.3, 1.0] 为平台，超速下降且不低于0.8
+        speed_efficiency = np.where(
+            speed_ratio < 0.3,
+            0.5 + 0.5 * speed_ratio / 0.3,
+            np.where(speed_ratio <= 1.0, 1.0, np.maximum(0.8, 1.0 - 0.2 * (speed_ratio - 1.0)))
+        )
         
-        # 综合效率
-        total_efficiency = flow_efficiency * head_efficiency * speed_efficiency
-        return min(total_efficiency, self.efficiency_params['peak_efficiency'])
+        total_efficiency = np.minimum(flow_efficiency * head_efficiency * speed_efficiency,
+                                      self._peak_efficiency)
+        # 有效流量范围 [0.1, 1.0] 之外效率记为0
+        return np.where((flow_ratio < 0.1) | (flow_ratio > 1.0), 0.0, total_efficiency)
         
     def _flow_efficiency_curve(self, flow_ratio: float) -> float:
         """流量效率特性曲线"""
-        peak_ratio = self.efficiency_params['peak_flow_ratio']
-        
-        if flow_ratio <= peak_ratio:
-            # 上升段
-            return 0.3 + 0.7 * (flow_ratio / peak_ratio)
-        else:
-            # 下降段
-            return 1.0 - 0.3 * ((flow_ratio - peak_ratio) / (1.0 - peak_ratio))
+        return flow_efficiency_curve(flow_ratio, self._peak_flow_ratio)
             
     def _head_efficiency_curve(self, head_ratio: float) -> float:
         """扬程效率特性曲线"""
-        if head_ratio < 0.5:
-            return 0.5 + head_ratio
-        elif head_ratio <= 1.0:
-            return 1.0
-        else:
-            return max(0.7, 1.0 - 0.3 * (head_ratio - 1.0))
+        return head_efficiency_curve(head_ratio)
             
     def _speed_efficiency_curve(self, speed_ratio: float) -> float:
         """转速效率特性曲线"""
-        if speed_ratio < 0.3:
-            return 0.5 + 0.5 * speed_ratio / 0.3
-        elif speed_ratio <= 1.0:
-            return 1.0
-        else:
-            return max(0.8, 1.0 - 0.2 * (speed_ratio - 1.0))
+        return speed_efficiency_curve(speed_ratio)
             
     def calculate_power(self, flow: float, head: float, efficiency: float) -> float:
         """计算功率消耗"""
-        if efficiency <= 0:
-            return 0.0
-        return (flow * head * 9.81 * 1000) / (efficiency * 1000)  # kW
-        
-    def find_optimal_operating_point(self, target_flow: float, target_head: float) -> EfficiencyPoint:
-        """寻找最优运行点"""
-        def objective(speed_ratio):
-            speed = speed_ratio * self.max_speed
-            efficiency = self.calculate_efficiency(target_flow, target_head, speed)
-            power = self.calculate_power(target_flow, target_head, efficiency)
-            return -efficiency  # 最大化效率（最小化负效率）
+        return pump_power(flow, head, efficiency)  # kW
+        
+    def find_optimal_operating_point(self, target_flow: float, target_head: float,
+                                     use_scipy: bool = False) -> EfficiencyPoint:
+        """寻找最优运行点；相同工况直接返回缓存结果"""
+        if use_scipy:
+            return self._compute_optimal_point(target_flow, target_head, use_scipy=True)
+        key = (target_flow, target_head)
+        point = self._optimal_points.get(key)
+        if point is None:
+            point = self._optimal_points[key] = self._compute_optimal_point(target_flow, target_head)
+        return point
+        
+    def _compute_optimal_point(self, target_flow: float, target_head: float,
+                               use_scipy: bool = False) -> EfficiencyPoint:
+        """
+        计算最优运行点
+        
+        流量和扬程固定时，效率中只有转速效率随转速变化；而转速效率曲线在搜索
+        区间 [0.3, 1.0] 上恒为最大值1.0，区间内任一转速效率都相同。因此直接取
+        能输送目标流量的最低转速（按相似定律流量与转速成正比），即
+        speed_ratio = clip(target_flow / max_flow, 0.3, 1.0)，无需数值寻优。
+        use_scipy=True 时改用 scipy 的有界一维搜索，仅用于对照验证。
+        """
+        if use_scipy:
+            from scipy.optimize import minimize_scalar
             
-        # 约束条件
-        constraints = [
-            {'type': 'ineq', 'fun': lambda x: x},  # speed_ratio >= 0
-            {'type': 'ineq', 'fun': lambda x: 1.0 - x}  # speed_ratio <= 1
-        ]
-        
-        # 优化
-        result = minimize_scalar(objective, bounds=(0.3, 1.0), method='bounded')
+            def objective(speed_ratio):
+                # 最大化效率（最小化负效率）
+                return -self.calculate_efficiency(target_flow, target_head, speed_ratio * self.max_speed)
+                
+            optimal_speed_ratio = minimize_scalar(objective, bounds=(0.3, 1.0), method='bounded').x
+        else:
+            optimal_speed_ratio = min(max(target_flow / self.max_flow, 0.3), 1.0)
         
-        optimal_speed_ratio = result.x
         optimal_speed = optimal_speed_ratio * self.max_speed
         optimal_efficiency = self.calculate_efficiency(target_flow, target_head, optimal_speed)
         optimal_power = self.calculate_power(target_flow, target_head, optimal_efficiency)
@@ -183,17 +269,53 @@ class VariableSpeedController:
             # 基于功率控制
             return min(1.0, self.target_flow / self.efficiency_model.max_flow) * self.efficiency_model.max_speed
             
+    def calculate_optimal_point(self) -> EfficiencyPoint:
+        """计算最优运行点：转速连同该转速下的效率和功率一并返回，调用方无需再次计算"""
+        if self.control_mode == "efficiency":
+            # 寻优过程已经算出效率和功率，直接返回
+            return self.efficiency_model.find_optimal_operating_point(
+                self.target_flow, self.target_head
+            )
+        speed = self.calculate_optimal_speed()
+        efficiency = self.get_efficiency_at_speed(speed)
+        return EfficiencyPoint(
+            flow=self.target_flow,
+            head=self.target_head,
+            efficiency=efficiency,
+            power=self.efficiency_model.calculate_power(self.target_flow, self.target_head, efficiency),
+            speed=speed
+        )
+            
     def get_efficiency_at_speed(self, speed: float) -> float:
         """获取指定转速下的效率"""
         return self.efficiency_model.calculate_efficiency(
             self.target_flow, self.target_head, speed
         )
 
+def _grow(records: np.ndarray) -> np.ndarray:
+    """把预分配的记录数组扩容为原来的两倍（至少1行），已有记录原样复制"""
+    grown = np.zeros(max(2 * records.shape[0], 1), dtype=records.dtype)
+    grown[:records.shape[0]] = records
+    return grown
+
+# 效率优化代理每步优化记录的结构化数组布局
+OPTIMIZATION_HISTORY_DTYPE = np.dtype([
+    ('time', 'f8'),
+    ('demand', 'f8'),
+    ('optimal_speed', 'f8'),
+    ('efficiency', 'f8'),
+    ('power', 'f8'),
+])
+
 class EfficiencyOptimizationAgent(Agent):
     """效率优化代理"""
     
+    # 目标扬程（简化计算，固定扬程）
+    TARGET_HEAD = 20.0
+    
     def __init__(self, agent_id: str, message_bus, demand_topic: str, 
-                 pump_station: PumpStation, efficiency_model: PumpEfficiencyModel):
+                 pump_station: PumpStation, efficiency_model: PumpEfficiencyModel,
+                 expected_steps: int = 1024):
         super().__init__(agent_id)
         self.bus = message_bus
         self.demand_topic = demand_topic
@@ -201,47 +323,54 @@ class EfficiencyOptimizationAgent(Agent):
         self.efficiency_model = efficiency_model
         self.variable_speed_controller = VariableSpeedController(efficiency_model)
         self.current_demand = 0.0
-        self.optimization_history = []
+        
+        # 优化历史：按预计步数预分配，每步写入一行，容量不足时按倍数扩容
+        self.optimization_history = np.zeros(expected_steps, dtype=OPTIMIZATION_HISTORY_DTYPE)
+        self.optimization_count = 0
         
         # 订阅需求主题
         self.bus.subscribe(self.demand_topic, self.handle_demand_message)
         
+    @property
+    def optimization_records(self):
+        """已记录部分的视图（不复制）"""
+        return self.optimization_history[:self.optimization_count]
+        
+    @property
+    def latest_optimization(self):
+        """最近一步的优化记录，尚无记录时为None"""
+        i = self.optimization_count
+        return self.optimization_history[i - 1] if i else None
+        
     def handle_demand_message(self, message):
         """处理需求消息"""
         self.current_demand = message.get('value', self.current_demand)
-        print(f"[EfficiencyAgent] Received demand: {self.current_demand}")
+        log.debug("[EfficiencyAgent] Received demand: %s", self.current_demand)
         
     def run(self, current_time: float):
         """运行效率优化"""
         # 使用当前需求（通过订阅更新）
         if self.current_demand <= 0:
-            print(f"[EfficiencyAgent] Warning: No demand received, current_demand={self.current_demand}")
+            log.warning("[EfficiencyAgent] No demand received, current_demand=%s", self.current_demand)
             return
             
-        # 计算目标扬程（简化计算）
-        target_head = 20.0  # 固定扬程
+        demand = self.current_demand
         
         # 更新控制器目标
-        self.variable_speed_controller.update_targets(self.current_demand, target_head)
+        self.variable_speed_controller.update_targets(demand, self.TARGET_HEAD)
         
-        # 计算最优转速
-        optimal_speed = self.variable_speed_controller.calculate_optimal_speed()
+        # 计算最优运行点（转速、效率、功率）；同一工况由效率模型的缓存直接返回
+        point = self.variable_speed_controller.calculate_optimal_point()
+        optimal_speed, efficiency, power = point.speed, point.efficiency, point.power
         
-        # 计算效率
-        efficiency = self.variable_speed_controller.get_efficiency_at_speed(optimal_speed)
-        
-        print(f"[EfficiencyAgent] Demand={self.current_demand}, Speed={optimal_speed}, Efficiency={efficiency}")
+        log.debug("[EfficiencyAgent] Demand=%s, Speed=%s, Efficiency=%s", demand, optimal_speed, efficiency)
         
         # 记录优化历史
-        self.optimization_history.append({
-            'time': current_time,
-            'demand': self.current_demand,
-            'optimal_speed': optimal_speed,
-            'efficiency': efficiency,
-            'power': self.efficiency_model.calculate_power(
-                self.current_demand, target_head, efficiency
-            )
-        })
+        i = self.optimization_count
+        if i == self.optimization_history.shape[0]:
+            self.optimization_history = _grow(self.optimization_history)
+        self.optimization_history[i] = (current_time, demand, optimal_speed, efficiency, power)
+        self.optimization_count = i + 1
         
         # 发布控制命令 - 适配当前的 Pump 接口
         # 基于效率决定是否启动泵（简化处理）
@@ -252,6 +381,11 @@ class EfficiencyOptimizationAgent(Agent):
 class VariableDemandAgent(Agent):
     """变化需求代理"""
     
+    # 优化测试需求模式：时刻到达各阈值 (s) 后切换到下一档需求 (m³/s)
+    # 低负荷 → 中负荷 → 高负荷 → 中低负荷 → 中高负荷 → 中等负荷
+    TEST_PATTERN_TIMES = (100.0, 200.0, 300.0, 400.0, 500.0)
+    TEST_PATTERN_DEMANDS = (5.0, 15.0, 25.0, 8.0, 20.0, 12.0)
+    
     def __init__(self, agent_id: str, message_bus, demand_topic: str):
         super().__init__(agent_id)
         self.bus = message_bus
@@ -266,70 +400,77 @@ class VariableDemandAgent(Agent):
         else:
             demand = self.base_demand
             
-        print(f"[DemandAgent] Publishing demand: {demand} at time {current_time}")
+        log.debug("[DemandAgent] Publishing demand: %s at time %s", demand, current_time)
         self.bus.publish(self.demand_topic, {'value': demand})
         
     def _optimization_test_pattern(self, time: float) -> float:
-        """优化测试需求模式"""
-        if time < 100:
-            return 5.0   # 低负荷
-        elif time < 200:
-            return 15.0  # 中负荷
-        elif time < 300:
-            return 25.0  # 高负荷
-        elif time < 400:
-            return 8.0   # 中低负荷
-        elif time < 500:
-            return 20.0  # 中高负荷
-        else:
-            return 12.0  # 中等负荷
+        """优化测试需求模式：对阈值二分查找得到当前需求档位"""
+        return self.TEST_PATTERN_DEMANDS[bisect.bisect_right(self.TEST_PATTERN_TIMES, time)]
+
+# 效率分析记录的结构化数组布局，按字段名即可取得整列视图
+EFFICIENCY_HISTORY_DTYPE = np.dtype([
+    ('time', 'f8'),
+    ('demand', 'f8'),
+    ('actual_flow', 'f8'),
+    ('speed', 'f8'),
+    ('efficiency', 'f8'),
+    ('power', 'f8'),
+    ('optimal_efficiency', 'f8'),
+    ('efficiency_loss', 'f8'),
+])
 
 class EfficiencyAnalyzer:
-    """效率分析器"""
-    
-    def __init__(self):
-        self.history = {
-            'time': [],
-            'demand': [],
-            'actual_flow': [],
-            'speed': [],
-            'efficiency': [],
-            'power': [],
-            'optimal_efficiency': [],
-            'efficiency_loss': []
-        }
+    """效率分析器：每步一行写入预分配的结构化数组，容量不足时按倍数扩容"""
+    
+    def __init__(self, num_steps: int = 1024):
+        self.history = np.zeros(num_steps, dtype=EFFICIENCY_HISTORY_DTYPE)
+        self.count = 0
+        
+    @property
+    def records(self):
+        """已记录部分的视图（不复制）"""
+        return self.history[:self.count]
         
     def record_step(self, time: float, demand: float, pump_state: Dict, 
-                   optimization_data: Dict):
-        """记录仿真步骤"""
-        self.history['time'].append(time)
-        self.history['demand'].append(demand)
-        self.history['actual_flow'].append(pump_state.get('total_outflow', 0))
-        # 使用优化数据中的转速，因为当前 Pump 类不直接支持转速
-        self.history['speed'].append(optimization_data.get('optimal_speed', 0))
-        self.history['efficiency'].append(pump_state.get('efficiency', 0))
-        self.history['power'].append(pump_state.get('total_power_draw_kw', 0))
-        self.history['optimal_efficiency'].append(optimization_data.get('efficiency', 0))
-        
-        # 计算效率损失
-        optimal_eff = optimization_data.get('efficiency', 0)
+                   optimization_data: Optional[np.void]):
+        """记录仿真步骤；optimization_data 为效率优化代理最近一步的记录（可为None）"""
+        i = self.count
+        if i == self.history.shape[0]:
+            self.history = _grow(self.history)
+        
+        if optimization_data is not None:
+            optimal_speed = optimization_data['optimal_speed']
+            optimal_eff = optimization_data['efficiency']
+        else:
+            optimal_speed = optimal_eff = 0.0
         actual_eff = pump_state.get('efficiency', 0)
-        efficiency_loss = max(0, optimal_eff - actual_eff)
-        self.history['efficiency_loss'].append(efficiency_loss)
+        self.history[i] = (
+            time,
+            demand,
+            pump_state.get('total_outflow', 0),
+            # 使用优化数据中的转速，因为当前 Pump 类不直接支持转速
+            optimal_speed,
+            actual_eff,
+            pump_state.get('total_power_draw_kw', 0),
+            optimal_eff,
+            max(0, optimal_eff - actual_eff)  # 效率损失
+        )
+        self.count = i + 1
         
     def analyze_efficiency_performance(self) -> Dict:
         """分析效率性能"""
-        if not self.history['time']:
+        if self.count == 0:
             return {}
+        records = self.records
             
         # 计算效率指标
-        avg_efficiency = np.mean(self.history['efficiency'])
-        avg_optimal_efficiency = np.mean(self.history['optimal_efficiency'])
-        avg_efficiency_loss = np.mean(self.history['efficiency_loss'])
+        avg_efficiency = records['efficiency'].mean()
+        avg_optimal_efficiency = records['optimal_efficiency'].mean()
+        avg_efficiency_loss = records['efficiency_loss'].mean()
         
         # 计算能耗指标
-        total_energy = np.sum(self.history['power']) * 1.0  # 假设时间步长为1秒
-        avg_power = np.mean(self.history['power'])
+        total_energy = records['power'].sum() * 1.0  # 假设时间步长为1秒
+        avg_power = records['power'].mean()
         
         # 计算节能潜力
         energy_savings_potential = avg_efficiency_loss * avg_power
@@ -346,14 +487,25 @@ class EfficiencyAnalyzer:
         
         return performance
         
-    def plot_efficiency_analysis(self, save_path: str = "pump_efficiency_results.png"):
-        """绘制效率分析结果"""
+    def plot_efficiency_analysis(self, save_path: str = "pump_efficiency_results.png",
+                                 dpi: int = 120, show: Optional[bool] = None):
+        """
+        绘制效率分析结果
+        
+        matplotlib 在这里才导入；后端选择见 shared/plot_backend.py，无图形界面时
+        使用非交互的Agg后端。show 为None时仅在交互式后端下调用 plt.show()。
+        """
+        from plot_backend import use_headless_backend, show_enabled
+        use_headless_backend()
+        import matplotlib.pyplot as plt
+        
+        records = self.records
         fig, ((ax1, ax2), (ax3, ax4)) = plt.subplots(2, 2, figsize=(16, 12))
         
         # 1. 效率对比
-        ax1.plot(self.history['time'], self.history['efficiency'], 'b-', 
+        ax1.plot(records['time'], records['efficiency'], 'b-', 
                 linewidth=2, label='Actual Efficiency')
-        ax1.plot(self.history['time'], self.history['optimal_efficiency'], 'r--', 
+        ax1.plot(records['time'], records['optimal_efficiency'], 'r--', 
                 linewidth=2, label='Optimal Efficiency')
         ax1.set_title('Efficiency Comparison', fontsize=14, fontweight='bold')
         ax1.set_xlabel('Time (s)')
@@ -362,7 +514,7 @@ class EfficiencyAnalyzer:
         ax1.grid(True, alpha=0.3)
         
         # 2. 效率损失
-        ax2.plot(self.history['time'], self.history['efficiency_loss'], 'orange', 
+        ax2.plot(records['time'], records['efficiency_loss'], 'orange', 
                 linewidth=2, label='Efficiency Loss')
         ax2.set_title('Efficiency Loss Over Time', fontsize=14, fontweight='bold')
         ax2.set_xlabel('Time (s)')
@@ -371,7 +523,7 @@ class EfficiencyAnalyzer:
         ax2.grid(True, alpha=0.3)
         
         # 3. 功率消耗
-        ax3.plot(self.history['time'], self.history['power'], 'purple', 
+        ax3.plot(records['time'], records['power'], 'purple', 
                 linewidth=2, label='Power Consumption')
         ax3.set_title('Power Consumption', fontsize=14, fontweight='bold')
         ax3.set_xlabel('Time (s)')
@@ -379,21 +531,27 @@ class EfficiencyAnalyzer:
         ax3.legend()
         ax3.grid(True, alpha=0.3)
         
-        # 4. 效率-流量特性
-        ax4.scatter(self.history['actual_flow'], self.history['efficiency'], 
-                   alpha=0.6, label='Actual Operating Points')
-        ax4.scatter(self.history['demand'], self.history['optimal_efficiency'], 
-                   alpha=0.6, label='Optimal Operating Points')
+        # 4. 效率-流量特性：散点只在保存为矢量格式时光栅化，PNG等位图本身已是像素
+        rasterize = os.path.splitext(save_path)[1].lower() in ('.pdf', '.svg', '.eps', '.ps')
+        ax4.scatter(records['actual_flow'], records['efficiency'], 
+                   alpha=0.6, label='Actual Operating Points', rasterized=rasterize)
+        ax4.scatter(records['demand'], records['optimal_efficiency'], 
+                   alpha=0.6, label='Optimal Operating Points', rasterized=rasterize)
         ax4.set_title('Efficiency vs Flow Rate', fontsize=14, fontweight='bold')
         ax4.set_xlabel('Flow Rate (m³/s)')
         ax4.set_ylabel('Efficiency')
         ax4.legend()
         ax4.grid(True, alpha=0.3)
         
-        plt.tight_layout()
-        plt.savefig(save_path, dpi=300, bbox_inches='tight')
+        fig.tight_layout()
+        fig.savefig(save_path, dpi=dpi, bbox_inches='tight')
         print(f"Results saved to {save_path}")
-        plt.show()
+        
+        if show is None:
+            show = show_enabled()
+        if show:
+            plt.show()
+        plt.close(fig)
 
 def create_efficiency_optimization_system():
     """创建效率优化系统"""
@@ -467,7 +625,11 @@ def create_efficiency_optimization_system():
     return harness, message_bus, DEMAND_TOPIC, CONTROL_TOPIC, pump_station, pump_params
 
 def run_efficiency_optimization_simulation():
-    """运行效率优化仿真"""
+    """
+    运行效率优化仿真
+    
+    模型和代理的逐步跟踪信息在本模块日志级别为DEBUG时输出（命令行 --verbose）
+    """
     print("\n=== Pump Efficiency Optimization System Simulation ===")
     print("This example demonstrates pump efficiency optimization techniques")
     print("Learning objectives:")
@@ -482,53 +644,60 @@ def run_efficiency_optimization_simulation():
     # 创建效率模型
     efficiency_model = PumpEfficiencyModel(pump_params)
     
+    dt = harness.dt
+    num_steps = int(harness.end_time / dt)
+    
     # 创建代理
     demand_agent = VariableDemandAgent("variable_demand_agent", message_bus, demand_topic)
     efficiency_agent = EfficiencyOptimizationAgent(
         "efficiency_optimization_agent", message_bus, demand_topic, 
-        pump_station, efficiency_model
+        pump_station, efficiency_model, num_steps
     )
     
     # 添加代理
     harness.add_agent(demand_agent)
     harness.add_agent(efficiency_agent)
     
-    # 创建分析器
-    analyzer = EfficiencyAnalyzer()
-    
     # 构建并运行仿真
     print("\n=== Building and Running Simulation ===")
     harness.build()
     
-    num_steps = int(harness.end_time / harness.dt)
+    # 创建分析器（按步数预分配记录）
+    analyzer = EfficiencyAnalyzer(num_steps)
     current_demand = 0.0
     
+    # 时间序列在循环前一次生成；循环内只保留必须逐步执行的代理运行、
+    # 物理步进和记录，所用方法事先绑定为局部变量
+    times = (np.arange(num_steps) * dt).tolist()
+    run_demand_agent = demand_agent.run
+    run_efficiency_agent = efficiency_agent.run
+    step_physical_models = harness._step_physical_models
+    get_pump_state = pump_station.get_state
+    record_step = analyzer.record_step
+    
     print(f"Running simulation for {num_steps} steps...")
     
-    for i in range(num_steps):
-        current_time = i * harness.dt
-        
+    for i, current_time in enumerate(times):
         # 运行代理
-        demand_agent.run(current_time)
-        efficiency_agent.run(current_time)
+        run_demand_agent(current_time)
+        run_efficiency_agent(current_time)
         
         # 需求通过代理的订阅机制自动更新，这里使用效率代理的当前需求
         current_demand = efficiency_agent.current_demand
             
         # 步进物理模型
-        harness._step_physical_models(harness.dt)
+        step_physical_models(dt)
         
         # 记录数据
-        pump_state = pump_station.get_state()
-        optimization_data = efficiency_agent.optimization_history[-1] if efficiency_agent.optimization_history else {}
-        analyzer.record_step(current_time, current_demand, pump_state, optimization_data)
+        pump_state = get_pump_state()
+        optimization_data = efficiency_agent.latest_optimization
+        record_step(current_time, current_demand, pump_state, optimization_data)
         
         # 打印状态（每50步）
         if i % 50 == 0:
-            optimization_data = efficiency_agent.optimization_history[-1] if efficiency_agent.optimization_history else {}
             print(f"Time {current_time:.0f}s: Demand={current_demand:.1f} m³/s, "
                   f"Flow={pump_state.get('total_outflow', 0):.1f} m³/s, "
-                  f"Speed={optimization_data.get('optimal_speed', 0):.0f} rpm, "
+                  f"Speed={optimization_data['optimal_speed'] if optimization_data is not None else 0:.0f} rpm, "
                   f"Efficiency={pump_state.get('efficiency', 0):.3f}, "
                   f"Power={pump_state.get('total_power_draw_kw', 0):.1f} kW")
     
@@ -560,4 +729,13 @@ def run_efficiency_optimization_simulation():
     return performance
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--verbose', action='store_true',
+                        help='show the per-step model and agent trace (DEBUG logging)')
+    args = parser.parse_args()
+    # 只配置本模块的日志输出，core_lib 等其他模块的日志级别保持不变
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    log.addHandler(handler)
+    log.setLevel(logging.DEBUG if args.verbose else logging.INFO)
     performance = run_efficiency_optimization_simulation()
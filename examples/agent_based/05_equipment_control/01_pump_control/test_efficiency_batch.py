@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+PumpEfficiencyModel.calculate_efficiency_batch 与逐点的 calculate_efficiency 一致性测试
+"""
+
+import numpy as np
+import pytest
+
+# pump_efficiency.py 在模块顶层导入 pandas
+pytest.importorskip('pandas')
+
+
+@pytest.fixture(scope='module')
+def model(load_example):
+    pump_efficiency = load_example('05_equipment_control/01_pump_control/pump_efficiency.py')
+    return pump_efficiency.PumpEfficiencyModel(
+        {'max_flow_rate': 30.0, 'max_head': 25.0, 'max_speed': 1800.0, 'power_consumption_kw': 120}
+    )
+
+
+def test_batch_matches_scalar(model):
+    # 覆盖各特性曲线的分段：流量比越界、峰值前后，扬程比 <0.5 / 平台 / 超扬程，转速比 <0.3 / 平台 / 超速
+    flows = np.linspace(0.0, 33.0, 23)
+    heads = np.array([5.0, 12.5, 20.0, 25.0, 31.0])
+    speeds = np.array([200.0, 540.0, 1200.0, 1800.0, 2100.0])
+    flow, head, speed = (grid.ravel() for grid in np.meshgrid(flows, heads, speeds, indexing='ij'))
+
+    batch = model.calculate_efficiency_batch(flow, head, speed)
+    scalar = np.array([model.calculate_efficiency(f, h, s) for f, h, s in zip(flow, head, speed)])
+
+    np.testing.assert_allclose(batch, scalar, rtol=1e-12, atol=1e-12)
+
+
+def test_batch_broadcasts_scalars(model):
+    speeds = np.linspace(300.0, 1800.0, 16)
+    batch = model.calculate_efficiency_batch(15.0, 20.0, speeds)
+    assert batch.shape == speeds.shape
+    np.testing.assert_allclose(batch, [model.calculate_efficiency(15.0, 20.0, s) for s in speeds])
@@ -0,0 +1,74 @@
+"""
+agent_based 示例测试的共享fixture
+
+示例脚本在模块顶层导入 core_lib（CHS-SDK）。纯数值辅助函数（指标计算、降采样、
+效率曲线等）的测试并不需要 core_lib：未安装时，load_example 在导入示例脚本期间
+用占位模块顶替 core_lib.*，导入完成后即移除，不影响其他测试。
+"""
+
+import importlib.abc
+import importlib.util
+import os
+import sys
+
+import pytest
+
+EXAMPLES_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class _CoreLibPlaceholder(importlib.abc.MetaPathFinder, importlib.abc.Loader):
+    """把 core_lib 及其子模块解析为占位包，包内任意名字都是空的占位类"""
+
+    def find_spec(self, fullname, path=None, target=None):
+        if fullname == 'core_lib' or fullname.startswith('core_lib.'):
+            return importlib.util.spec_from_loader(fullname, self, is_package=True)
+        return None
+
+    def create_module(self, spec):
+        return None
+
+    def exec_module(self, module):
+        placeholders = {}
+
+        def __getattr__(name):
+            if name.startswith('__'):
+                raise AttributeError(name)
+            if name not in placeholders:
+                placeholders[name] = type(name, (), {'__init__': lambda self, *args, **kwargs: None})
+            return placeholders[name]
+
+        module.__getattr__ = __getattr__
+
+
+def _core_lib_available():
+    try:
+        import core_lib  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+@pytest.fixture(scope='session')
+def load_example():
+    """
+    按相对于 examples/agent_based 的路径导入示例脚本，返回模块对象；
+    core_lib 未安装时导入期间使用占位模块
+    """
+    def load(relative_path):
+        path = os.path.join(EXAMPLES_DIR, relative_path)
+        name = '_example_' + os.path.splitext(os.path.basename(path))[0]
+        spec = importlib.util.spec_from_file_location(name, path)
+        module = importlib.util.module_from_spec(spec)
+        placeholder = None if _core_lib_available() else _CoreLibPlaceholder()
+        if placeholder is not None:
+            sys.meta_path.insert(0, placeholder)
+        try:
+            spec.loader.exec_module(module)
+        finally:
+            if placeholder is not None:
+                sys.meta_path.remove(placeholder)
+                for key in [key for key in sys.modules if key == 'core_lib' or key.startswith('core_lib.')]:
+                    del sys.modules[key]
+        return module
+
+    return load
@@ -0,0 +1,19 @@
+"""
+agent_based 示例共用的numba可选导入
+
+numba为可选依赖（见 requirements.txt）。已安装时 njit 即 numba.njit；未安装时
+njit 为不做任何事的装饰器，被装饰的函数以纯Python运行，结果相同，只是更慢。
+两种写法都支持：@njit 与 @njit(cache=True, fastmath=True)。
+"""
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        """numba未安装时的替身：原样返回被装饰的函数"""
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda func: func
@@ -0,0 +1,30 @@
+"""
+agent_based 示例共用的matplotlib后端选择
+
+无图形界面的Linux环境（未设置 DISPLAY，也未通过 MPLBACKEND 指定后端）下使用
+非交互的Agg后端，跳过GUI后端初始化；Windows、macOS 和桌面Linux保持默认后端。
+在导入 matplotlib.pyplot 之前调用 use_headless_backend()，绘图完成后用
+show_enabled() 决定是否调用 plt.show()。
+"""
+
+import os
+import sys
+
+
+def is_headless():
+    """当前是否为无图形界面的Linux环境"""
+    return (sys.platform.startswith('linux') and not os.environ.get('DISPLAY')
+            and not os.environ.get('MPLBACKEND'))
+
+
+def use_headless_backend():
+    """无图形界面时切换到Agg后端（须在导入pyplot之前调用）"""
+    if is_headless():
+        import matplotlib
+        matplotlib.use('Agg')
+
+
+def show_enabled():
+    """当前后端是否为交互式；Agg等非交互后端下不调用 plt.show()"""
+    import matplotlib
+    return matplotlib.get_backend().lower() != 'agg'
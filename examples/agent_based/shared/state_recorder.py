@@ -0,0 +1,78 @@
+"""
+agent_based 示例共用的仿真状态记录器
+
+各示例脚本把本目录加入 sys.path 后导入：
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'shared')))
+    from state_recorder import StateRecorder
+"""
+
+import numpy as np
+
+
+class StateRecorder:
+    """
+    在每个物理步后把选定的组件状态写入预分配的结构化数组（每步一行）
+
+    fields 为 (组件ID, 状态字段) 列表，组件在 harness.components 中按ID查找，
+    因此须在组件加入harness之后创建；状态通过组件的 get_state() 读取。
+    record_time 为 True 时额外记录 harness.t（字段 't'）。n_steps 为预分配的行数，
+    记录超出时数组按倍数扩容，不会丢弃数据。
+
+    注意：这是在 harness.history 之外的一份额外记录，并不替代它——SimulationHarness
+    仍按原样把全部组件状态写入 harness.history。记录器只是把分析要用的几列放进连续
+    的数组，便于直接切片。
+    """
+    def __init__(self, harness, fields, n_steps, dtype='f8', record_time=False):
+        layout = [('t', 'f8')] if record_time else []
+        layout += [(f'{comp_id}_{field}', dtype) for comp_id, field in fields]
+        self.history = np.zeros(n_steps, dtype=np.dtype(layout))
+        names = self.history.dtype.names[1:] if record_time else self.history.dtype.names
+        self.columns = {key: self.history[name] for key, name in zip(fields, names)}
+        self.count = 0
+        self._harness = harness
+        self._record_time = record_time
+        self._sources = [(harness.components[comp_id], field) for comp_id, field in fields]
+
+        # 包装harness的物理步进方法，步进完成后立即记录状态
+        step_physical_models = harness._step_physical_models
+
+        def recording_step(dt, controller_actions=None):
+            result = step_physical_models(dt, controller_actions)
+            self.record()
+            return result
+
+        harness._step_physical_models = recording_step
+
+    def record(self):
+        i = self.count
+        if i == self.history.shape[0]:
+            self._grow()
+        row = tuple(component.get_state()[field] for component, field in self._sources)
+        self.history[i] = (self._harness.t,) + row if self._record_time else row
+        self.count = i + 1
+
+    def _grow(self):
+        """把记录数组扩容为原来的两倍（至少1行），已有记录原样复制，列视图随之更新"""
+        grown = np.zeros(max(2 * self.history.shape[0], 1), dtype=self.history.dtype)
+        grown[:self.history.shape[0]] = self.history
+        self.history = grown
+        names = grown.dtype.names[1:] if self._record_time else grown.dtype.names
+        self.columns = {key: grown[name] for key, name in zip(self.columns, names)}
+
+    @property
+    def records(self):
+        """已记录部分的视图（不复制）"""
+        return self.history[:self.count]
+
+    @property
+    def time(self):
+        """已记录的仿真时间（需 record_time=True）"""
+        return self.history['t'][:self.count]
+
+    def __getitem__(self, key):
+        """已记录部分的列视图（不复制），如 recorder['reservoir_1', 'water_level']"""
+        return self.columns[key][:self.count]
+
+    def series(self):
+        """按记录字段的顺序返回各列视图"""
+        return [self[key] for key in self.columns]